@@ -0,0 +1,1019 @@
+from __future__ import annotations
+from typing import Any, BinaryIO, Dict, Generic, Iterator, List, Sequence, Tuple, Type, TypeVar
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+import csv
+import gc
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import time
+import tracemalloc
+
+
+class Person:
+    _journal: BalanceJournal = None
+    _account: int = 0
+
+    def __init__(self, first_name: str, last_name: str, age: int = 25):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.age = age
+        self._balance: float = 0.0
+        self._job_type: IJob = Unemployed()
+
+
+    @property
+    def job_type(self) -> IJob:
+        return self._job_type
+
+
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def full_name(self) -> str:
+        '''
+        Get the person's full name. It is only built again after a name has changed
+        '''
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
+
+
+    @property
+    def balance(self) -> float:
+        '''
+        Get how much money the person got in the bank
+        '''
+        return self._balance
+    
+
+    def spend_money(self, amount: float) -> None:
+        '''
+        The person used this amount of money
+        '''
+        if amount > 0:
+            self._balance -= amount
+            if self._journal is not None:
+                self._journal.record(self._account, -amount)
+
+
+    def give_salery(self, amount: float) -> None:
+        '''
+        The Person recieved the given amount of salery
+        '''
+        if amount > 0:
+            self._balance += amount 
+            if self._journal is not None:
+                self._journal.record(self._account, amount)
+
+
+    def set_job(self, job: IJob) -> None:
+        self._job_type = job
+
+    
+    @property
+    def is_adult(self) -> bool:
+        '''
+        Check if the person is an adult
+        '''
+        return self.age > 0
+    
+
+    @property
+    def info_as_string(self) -> str:
+        '''
+        Get info as a string
+        '''
+        string: str = f"Person\n"
+        string += f"  Name: {self.full_name}\n"
+        string += f"  Age: {self.age}\n"
+        string += f"  Balance: {self.balance}\n"
+        return string
+    
+
+    def __str__(self) -> str:
+        return self.info_as_string
+    
+
+    def __eq__(self, ref_person: Person) -> bool:
+        return self.full_name == ref_person.full_name and self.age == ref_person.age
+    
+
+    def __gt__(self, ref_person: Person) -> bool:
+        return self.age > ref_person.age
+    
+
+    def __hash__(self) -> hash:
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
+
+
+
+    
+class Company:
+    _nr_of_companies_created: int = 0
+
+    def __init__(self, name: str):
+        self.name = name
+
+        self._persons_in_company: List[Person] = []
+
+        Company._nr_of_companies_created += 1
+        self._company_id: int = Company._nr_of_companies_created
+
+
+    @property
+    def company_id(self) -> int:
+        return self._company_id
+
+
+
+    def hire(self, person: Person, job_type: Type[IJob]) -> None:
+        '''
+        Hire a person to the company
+        '''
+        person.set_job(job_type())
+        self._persons_in_company += [person]
+
+    
+    def pay_salery(self) -> None:
+        '''
+        Pay salery to personnel
+        '''
+        for person in self._persons_in_company:
+            person.give_salery(person.job_type.salery)
+
+
+    @staticmethod
+    def total_nr_of_created_companies() -> int:
+        return Company._nr_of_companies_created
+    
+
+    def __len__(self) -> int:
+        return len(self._persons_in_company)
+    
+
+    def __str__(self) -> str:
+        string: str = f"Company\n"
+        string += f"  Name: {self.name}\n"
+        string += f"  Workers: {len(self)}"
+        return string
+    
+    
+
+
+
+class WebshopCompany(Company):
+    def __init__(self, name: str, products: List[str]):
+        super().__init__(name)
+        self._products = products
+
+
+    @property
+    def products(self) -> List[str]:
+        return self._products
+    
+
+    def __str__(self) -> str:
+        string = super().__str__()
+        string += f"  Products: {self.products}\n"
+        return string
+
+
+
+class IJob:
+    def __init__(self):
+        pass
+    
+    
+    def do_work(self) -> None:
+        raise NotImplementedError("do_work() not implemented")
+
+
+    @property
+    def salery(self) -> float:
+        raise NotImplementedError("salery() not implemented")    
+
+
+    
+
+class CEO(IJob):
+    def __init__(self):
+        self._salery: float = 75_000
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Creating a strategy or something")
+
+
+
+
+
+class Programmer(IJob):
+    def __init__(self):
+        self._salery: float = 45_000
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Making some code")
+
+
+
+
+class Unemployed(IJob):
+    def __init__(self):
+        self._salery: float = 0
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Searching for work")
+
+
+
+
+# The file format is little-endian, with every column aligned to 8 bytes:
+#
+#   Person block:  header | string pool | balances f64 | first name ids u32 | last name ids u32 | ages i32 | job ids u8
+#   String pool:   byte length of every string u32 | utf-8 bytes of all strings
+#   Company file:  company header | string pool with the name and products | person block
+
+PERSON_MAGIC: bytes = b"IDAP"
+COMPANY_MAGIC: bytes = b"IDAC"
+FORMAT_VERSION: int = 1
+
+PERSON_HEADER = struct.Struct("<4sHxxQII")
+COMPANY_HEADER = struct.Struct("<4sHBxII")
+
+JOB_TYPES: List[Type[IJob]] = [Unemployed, CEO, Programmer]
+JOB_IDS: Dict[Type[IJob], int] = {job_type: job_id for job_id, job_type in enumerate(JOB_TYPES)}
+
+COMPANY_TYPES: List[Type[Company]] = [Company, WebshopCompany]
+
+JOB_NAMES: Dict[str, Type[IJob]] = {job_type.__name__.lower(): job_type for job_type in JOB_TYPES}
+PersonRecord = Tuple[str, str, int, float, Type[IJob]]
+
+
+def _padding(nr_of_bytes: int) -> bytes:
+    return bytes(-nr_of_bytes % 8)
+
+
+def _write_strings(file: BinaryIO, strings: Sequence[str]) -> Tuple[int, int]:
+    '''
+    Write a string pool and get the number of strings and of string bytes
+    '''
+    encoded_strings: List[bytes] = [string.encode() for string in strings]
+    lengths = array("I", map(len, encoded_strings))
+    string_bytes: bytes = b"".join(encoded_strings)
+    file.write(lengths)
+    file.write(string_bytes)
+    file.write(_padding(lengths.itemsize * len(lengths) + len(string_bytes)))
+    return len(encoded_strings), len(string_bytes)
+
+
+def _read_strings(buffer: memoryview, offset: int, nr_of_strings: int, nr_of_string_bytes: int) -> Tuple[List[str], int]:
+    '''
+    Read a string pool and get the strings and the offset after the pool
+    '''
+    lengths = array("I")
+    lengths.frombytes(buffer[offset:offset + 4 * nr_of_strings])
+    offset += 4 * nr_of_strings
+    string_bytes: bytes = bytes(buffer[offset:offset + nr_of_string_bytes])
+
+    strings: List[str] = []
+    string_offset: int = 0
+    for length in lengths:
+        strings += [string_bytes[string_offset:string_offset + length].decode()]
+        string_offset += length
+    return strings, offset + nr_of_string_bytes + len(_padding(4 * nr_of_strings + nr_of_string_bytes))
+
+
+def write_person_block(file: BinaryIO, persons: Sequence[Person]) -> None:
+    '''
+    Write the persons as a string pool of their names and a column per field
+    '''
+    string_ids: Dict[str, int] = {}
+    first_name_ids = array("I", [string_ids.setdefault(person.first_name, len(string_ids)) for person in persons])
+    last_name_ids = array("I", [string_ids.setdefault(person.last_name, len(string_ids)) for person in persons])
+    ages = array("i", [person.age for person in persons])
+    balances = array("d", [person.balance for person in persons])
+    job_ids = array("B", [JOB_IDS[type(person.job_type)] for person in persons])
+
+    header_position: int = file.tell()
+    file.write(bytes(PERSON_HEADER.size))
+    nr_of_strings, nr_of_string_bytes = _write_strings(file, list(string_ids))
+    end_position: int = file.tell()
+    file.seek(header_position)
+    file.write(PERSON_HEADER.pack(PERSON_MAGIC, FORMAT_VERSION, len(persons), nr_of_strings, nr_of_string_bytes))
+    file.seek(end_position)
+
+    for column in [balances, first_name_ids, last_name_ids, ages, job_ids]:
+        file.write(column)
+        file.write(_padding(column.itemsize * len(column)))
+
+
+@dataclass
+class PersonBlockLayout:
+    nr_of_persons: int
+    strings: List[str]
+    balances_offset: int
+    first_name_ids_offset: int
+    last_name_ids_offset: int
+    ages_offset: int
+    job_ids_offset: int
+    end_offset: int
+
+
+def read_person_block_layout(buffer: memoryview, offset: int = 0) -> PersonBlockLayout:
+    '''
+    Read the header and string pool of a person block and find where each column starts
+    '''
+    magic, version, nr_of_persons, nr_of_strings, nr_of_string_bytes = PERSON_HEADER.unpack_from(buffer, offset)
+    if magic != PERSON_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a version {FORMAT_VERSION} person block")
+    strings, offset = _read_strings(buffer, offset + PERSON_HEADER.size, nr_of_strings, nr_of_string_bytes)
+
+    column_offsets: List[int] = []
+    for itemsize in [8, 4, 4, 4, 1]:
+        column_offsets += [offset]
+        offset += itemsize * nr_of_persons + len(_padding(itemsize * nr_of_persons))
+    return PersonBlockLayout(nr_of_persons, strings, *column_offsets, offset)
+
+
+def _read_column(buffer: memoryview, typecode: str, offset: int, nr_of_items: int) -> array:
+    column = array(typecode)
+    column.frombytes(buffer[offset:offset + column.itemsize * nr_of_items])
+    return column
+
+
+def _person_from_fields(first_name: str, last_name: str, age: int, balance: float, job: IJob) -> Person:
+    '''
+    Create a person from stored fields without going through __init__ and the name setters
+    '''
+    person: Person = Person.__new__(Person)
+    person.__dict__ = {"_first_name": first_name, "_last_name": last_name, "_full_name": None, "_hash": None, "age": age, "_balance": balance, "_job_type": job}
+    return person
+
+
+def read_person_block(buffer: memoryview, offset: int = 0) -> Tuple[List[Person], int]:
+    '''
+    Read the persons of a person block and get the offset after the block.
+    Persons with the same job share one job instance. The garbage collector
+    is paused meanwhile, as it would otherwise scan the new persons again
+    and again while millions of them are created
+    '''
+    layout: PersonBlockLayout = read_person_block_layout(buffer, offset)
+    nr_of_persons: int = layout.nr_of_persons
+    strings: List[str] = layout.strings
+    jobs: List[IJob] = [job_type() for job_type in JOB_TYPES]
+
+    gc_was_enabled: bool = gc.isenabled()
+    gc.disable()
+    try:
+        persons: List[Person] = [
+            _person_from_fields(strings[first_name_id], strings[last_name_id], age, balance, jobs[job_id])
+            for first_name_id, last_name_id, age, balance, job_id in zip(
+                _read_column(buffer, "I", layout.first_name_ids_offset, nr_of_persons),
+                _read_column(buffer, "I", layout.last_name_ids_offset, nr_of_persons),
+                _read_column(buffer, "i", layout.ages_offset, nr_of_persons),
+                _read_column(buffer, "d", layout.balances_offset, nr_of_persons),
+                _read_column(buffer, "B", layout.job_ids_offset, nr_of_persons),
+            )
+        ]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return persons, layout.end_offset
+
+
+def save_persons(persons: Sequence[Person], path: str) -> None:
+    with open(path, "wb") as file:
+        write_person_block(file, persons)
+
+
+def load_persons(path: str) -> List[Person]:
+    with open(path, "rb") as file:
+        persons, _ = read_person_block(memoryview(file.read()))
+    return persons
+
+
+def save_company(company: Company, path: str) -> None:
+    '''
+    Save the company with its name, products and personnel
+    '''
+    products: List[str] = company.products if isinstance(company, WebshopCompany) else []
+    with open(path, "wb") as file:
+        file.write(bytes(COMPANY_HEADER.size))
+        nr_of_strings, nr_of_string_bytes = _write_strings(file, [company.name] + products)
+        person_block_position: int = file.tell()
+        file.seek(0)
+        file.write(COMPANY_HEADER.pack(COMPANY_MAGIC, FORMAT_VERSION, COMPANY_TYPES.index(type(company)), nr_of_strings, nr_of_string_bytes))
+        file.seek(person_block_position)
+        write_person_block(file, company._persons_in_company)
+
+
+def load_company(path: str) -> Company:
+    with open(path, "rb") as file:
+        buffer = memoryview(file.read())
+
+    magic, version, company_type_id, nr_of_strings, nr_of_string_bytes = COMPANY_HEADER.unpack_from(buffer, 0)
+    if magic != COMPANY_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} company file")
+    strings, offset = _read_strings(buffer, COMPANY_HEADER.size, nr_of_strings, nr_of_string_bytes)
+
+    company_type: Type[Company] = COMPANY_TYPES[company_type_id]
+    company: Company = WebshopCompany(strings[0], strings[1:]) if company_type is WebshopCompany else Company(strings[0])
+    company._persons_in_company, _ = read_person_block(buffer, offset)
+    return company
+
+
+def _job_type_from_name(job_name: str) -> Type[IJob]:
+    try:
+        return JOB_NAMES[job_name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown job {job_name!r}, expected one of {list(JOB_NAMES)}") from None
+
+
+def read_person_records(path: str, chunk_size: int = 10_000) -> Iterator[List[PersonRecord]]:
+    '''
+    Read (first name, last name, age, balance, job type) records from a .csv file with a header row
+    or a .jsonl file with one object per line, chunk_size records at a time. Only one chunk is in
+    memory at once, so the memory used does not depend on the size of the file. The balance column is optional
+    '''
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith(".csv"):
+            rows = csv.reader(file)
+            header: List[str] = next(rows, [])
+            first_name_column, last_name_column, age_column, job_column = [header.index(column) for column in ["first_name", "last_name", "age", "job"]]
+            balance_column: int = header.index("balance") if "balance" in header else None
+            records: Iterator[PersonRecord] = (
+                (row[first_name_column], row[last_name_column], int(row[age_column]),
+                 float(row[balance_column] or 0.0) if balance_column is not None else 0.0, _job_type_from_name(row[job_column]))
+                for row in rows if row
+            )
+        elif path.endswith(".jsonl"):
+            records = (
+                (row["first_name"], row["last_name"], int(row["age"]), float(row.get("balance", 0.0)), _job_type_from_name(row["job"]))
+                for row in map(json.loads, filter(str.strip, file))
+            )
+        else:
+            raise ValueError(f"{path} is neither a .csv nor a .jsonl file")
+
+        while chunk := list(islice(records, chunk_size)):
+            yield chunk
+
+
+def stream_persons(path: str, chunk_size: int = 10_000) -> Iterator[Tuple[Person, Type[IJob]]]:
+    '''
+    Lazily create the persons of a .csv or .jsonl file together with their job type.
+    Persons with the same job share one job instance, like in read_person_block,
+    until they are hired and get a job of their own
+    '''
+    jobs: Dict[Type[IJob], IJob] = {job_type: job_type() for job_type in JOB_TYPES}
+    for records in read_person_records(path, chunk_size):
+        for first_name, last_name, age, balance, job_type in records:
+            yield _person_from_fields(first_name, last_name, age, balance, jobs[job_type]), job_type
+
+
+def import_into_company(company: Company, path: str, chunk_size: int = 10_000) -> int:
+    '''
+    Hire every person of a .csv or .jsonl file to the company and get how many were hired.
+    The garbage collector is paused meanwhile, like in read_person_block
+    '''
+    nr_of_hired_persons: int = 0
+    gc_was_enabled: bool = gc.isenabled()
+    gc.disable()
+    try:
+        for person, job_type in stream_persons(path, chunk_size):
+            company.hire(person, job_type)
+            nr_of_hired_persons += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return nr_of_hired_persons
+
+
+
+
+class MappedPersonStore:
+    '''
+    A person file mapped into memory. Nothing is read up front except the
+    string pool; every column is a typed memoryview straight onto the mapped
+    pages, so a query on ages only ever touches the pages of the age column.
+    Processes that map the same file share its pages through the page cache
+    '''
+    def __init__(self, path: str, writable: bool = False):
+        self._file = open(path, "r+b" if writable else "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        layout: PersonBlockLayout = read_person_block_layout(self._buffer)
+        self._nr_of_persons: int = layout.nr_of_persons
+        self._strings: List[str] = layout.strings
+        self._jobs: List[IJob] = [job_type() for job_type in JOB_TYPES]
+
+        self._balances = self._column("d", layout.balances_offset)
+        self._first_name_ids = self._column("I", layout.first_name_ids_offset)
+        self._last_name_ids = self._column("I", layout.last_name_ids_offset)
+        self._ages = self._column("i", layout.ages_offset)
+        self._job_ids = self._column("B", layout.job_ids_offset)
+
+
+    def _column(self, typecode: str, offset: int) -> memoryview:
+        itemsize: int = struct.calcsize(typecode)
+        return self._buffer[offset:offset + itemsize * self._nr_of_persons].cast(typecode)
+    
+
+    def __len__(self) -> int:
+        return self._nr_of_persons
+    
+
+    def __getitem__(self, index: int) -> MappedPerson:
+        if not 0 <= index < self._nr_of_persons:
+            raise IndexError("MappedPersonStore index out of range")
+        return MappedPerson(self, index)
+    
+
+    def __iter__(self) -> Iterator[MappedPerson]:
+        return (MappedPerson(self, index) for index in range(self._nr_of_persons))
+    
+
+    def older_than(self, age: int, start: int = 0, stop: int = None) -> List[MappedPerson]:
+        '''
+        Get the persons older than age, only reading the age column
+        '''
+        stop = self._nr_of_persons if stop is None else stop
+        return [MappedPerson(self, start + index) for index, person_age in enumerate(self._ages[start:stop]) if person_age > age]
+    
+
+    def close(self) -> None:
+        for column in [self._balances, self._first_name_ids, self._last_name_ids, self._ages, self._job_ids, self._buffer]:
+            column.release()
+        self._mmap.close()
+        self._file.close()
+
+
+    def __enter__(self) -> MappedPersonStore:
+        return self
+    
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+
+
+class MappedPerson:
+    '''
+    A person in a MappedPersonStore. It only holds the store and its index,
+    and reads every field from the mapped file when it is asked for
+    '''
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store: MappedPersonStore, index: int):
+        self._store = store
+        self._index = index
+
+
+    @property
+    def first_name(self) -> str:
+        return self._store._strings[self._store._first_name_ids[self._index]]
+    
+
+    @property
+    def last_name(self) -> str:
+        return self._store._strings[self._store._last_name_ids[self._index]]
+    
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}"
+    
+
+    @property
+    def age(self) -> int:
+        return self._store._ages[self._index]
+    
+
+    @property
+    def _balance(self) -> float:
+        return self._store._balances[self._index]
+
+
+    @property
+    def job_type(self) -> IJob:
+        return self._store._jobs[self._store._job_ids[self._index]]
+    
+
+    def spend_money(self, amount: float) -> None:
+        '''
+        The person used this amount of money. Needs a writable store
+        '''
+        if amount > 0:
+            self._store._balances[self._index] -= amount
+
+
+    def give_salery(self, amount: float) -> None:
+        '''
+        The Person recieved the given amount of salery. Needs a writable store
+        '''
+        if amount > 0:
+            self._store._balances[self._index] += amount
+
+    balance = Person.balance
+    is_adult = Person.is_adult
+    info_as_string = Person.info_as_string
+    __str__ = Person.__str__
+
+
+
+
+def count_older_than_in_file(path: str, age: int, start: int, stop: int) -> int:
+    '''
+    Count the persons older than age in a slice of a person file. Every worker
+    maps the file itself, and they all share the same pages
+    '''
+    with MappedPersonStore(path) as store:
+        return len(store.older_than(age, start, stop))
+
+
+
+
+class BalanceJournal:
+    '''
+    An append-only log of balance changes, so balances survive a crash.
+    Every change is an (account, delta) record. Records are buffered and
+    written batch_size at a time, followed by an fsync if fsync is True.
+    A snapshot writes all balances and starts a new, empty log, so recovering
+    is loading the latest snapshot and replaying the short log after it
+    '''
+    RECORD = struct.Struct("<Id")
+    SNAPSHOT_HEADER = struct.Struct("<4sHxxQ")
+    SNAPSHOT_MAGIC: bytes = b"IDAS"
+
+    def __init__(self, directory: str, batch_size: int = 4096, fsync: bool = True):
+        self._directory = directory
+        self._batch_size = batch_size
+        self._fsync = fsync
+        self._pending_records = bytearray()
+        self._nr_of_pending_records: int = 0
+        self._attached_persons: List[Person] = []
+        self._generation: int = BalanceJournal._latest_generation(directory)
+        self._log_file: BinaryIO = open(self._log_path(self._generation), "ab")
+        # Cut off a record that was only half written when the program stopped
+        self._log_file.truncate(self._log_file.tell() - self._log_file.tell() % BalanceJournal.RECORD.size)
+
+
+    @staticmethod
+    def _latest_generation(directory: str) -> int:
+        generations: List[int] = [int(file_name[9:17]) for file_name in os.listdir(directory) if file_name.startswith("snapshot-") and file_name.endswith(".bin")]
+        return max(generations, default=0)
+    
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self._directory, f"journal-{generation:08d}.log")
+    
+
+    def _snapshot_path(self, generation: int) -> str:
+        return os.path.join(self._directory, f"snapshot-{generation:08d}.bin")
+
+
+    def attach(self, persons: Sequence[Person]) -> None:
+        '''
+        Log the balance changes of the persons, using their index as account
+        '''
+        for account, person in enumerate(persons):
+            person._journal = self
+            person._account = account
+        self._attached_persons += persons
+
+
+    def detach(self) -> None:
+        '''
+        Stop logging the balance changes of the attached persons
+        '''
+        for person in self._attached_persons:
+            if person._journal is self:
+                del person._journal
+                del person._account
+        self._attached_persons = []
+
+
+    def record(self, account: int, delta: float) -> None:
+        self._pending_records += BalanceJournal.RECORD.pack(account, delta)
+        self._nr_of_pending_records += 1
+        if self._nr_of_pending_records >= self._batch_size:
+            self.flush()
+
+
+    def flush(self) -> None:
+        '''
+        Write the buffered records to the log
+        '''
+        self._log_file.write(self._pending_records)
+        self._log_file.flush()
+        if self._fsync:
+            os.fsync(self._log_file.fileno())
+        self._pending_records.clear()
+        self._nr_of_pending_records = 0
+
+
+    def snapshot(self, balances: Sequence[float]) -> None:
+        '''
+        Save all balances and start a new log. The snapshot is written to a
+        temporary file first, so a crash never leaves half a snapshot behind
+        '''
+        self.flush()
+        balance_column = array("d", balances)
+        snapshot_path: str = self._snapshot_path(self._generation + 1)
+        with open(snapshot_path + ".tmp", "wb") as snapshot_file:
+            snapshot_file.write(BalanceJournal.SNAPSHOT_HEADER.pack(BalanceJournal.SNAPSHOT_MAGIC, FORMAT_VERSION, len(balance_column)))
+            snapshot_file.write(balance_column)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+
+        self._log_file.close()
+        for old_path in [self._log_path(self._generation), self._snapshot_path(self._generation)]:
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        self._generation += 1
+        self._log_file = open(self._log_path(self._generation), "ab")
+
+
+    def close(self) -> None:
+        '''
+        Write the last records and detach the persons, so their later balance changes are not logged
+        '''
+        if self._log_file.closed:
+            return
+        self.flush()
+        self._log_file.close()
+        self.detach()
+
+
+    @staticmethod
+    def recover(directory: str) -> array:
+        '''
+        Get the balance of every account from the latest snapshot and the log after it.
+        A record that was only half written when the program stopped is ignored
+        '''
+        generation: int = BalanceJournal._latest_generation(directory)
+        balances = array("d")
+
+        snapshot_path: str = os.path.join(directory, f"snapshot-{generation:08d}.bin")
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as snapshot_file:
+                magic, version, nr_of_accounts = BalanceJournal.SNAPSHOT_HEADER.unpack(snapshot_file.read(BalanceJournal.SNAPSHOT_HEADER.size))
+                if magic != BalanceJournal.SNAPSHOT_MAGIC or version != FORMAT_VERSION:
+                    raise ValueError(f"{snapshot_path} is not a version {FORMAT_VERSION} snapshot")
+                balances.fromfile(snapshot_file, nr_of_accounts)
+
+        log_path: str = os.path.join(directory, f"journal-{generation:08d}.log")
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as log_file:
+                records: bytes = log_file.read()
+            records = records[:len(records) - len(records) % BalanceJournal.RECORD.size]
+            for account, delta in BalanceJournal.RECORD.iter_unpack(records):
+                if account >= len(balances):
+                    balances.extend([0.0] * (account + 1 - len(balances)))
+                balances[account] += delta
+        return balances
+
+
+    @staticmethod
+    def restore(persons: Sequence[Person], balances: Sequence[float]) -> None:
+        for person, balance in zip(persons, balances):
+            person._balance = balance
+
+
+
+
+def benchmark_save_and_load(nr_of_persons: int) -> None:
+    '''
+    Compare saving and loading persons in the binary format, with pickle and as JSON
+    '''
+    first_names: List[str] = ["Mathias", "Tobias", "Rasmus", "Frank"]
+    persons: List[Person] = [Person(first_names[index % 4], f"Nr. {index % 1000}", 18 + index % 60) for index in range(nr_of_persons)]
+    for index, person in enumerate(persons):
+        person.give_salery(index % 100_000)
+
+    def save_json(path: str) -> None:
+        with open(path, "w") as file:
+            json.dump([[person.first_name, person.last_name, person.age, person.balance, JOB_IDS[type(person.job_type)]] for person in persons], file)
+
+    def load_json(path: str) -> List[Person]:
+        jobs: List[IJob] = [job_type() for job_type in JOB_TYPES]
+        with open(path) as file:
+            return [_person_from_fields(first_name, last_name, age, balance, jobs[job_id]) for first_name, last_name, age, balance, job_id in json.load(file)]
+
+    def save_pickle(path: str) -> None:
+        with open(path, "wb") as file:
+            pickle.dump(persons, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load_pickle(path: str) -> List[Person]:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, save, load in [("binary", save_persons, load_persons), ("pickle", save_pickle, load_pickle), ("json", save_json, load_json)]:
+            path: str = os.path.join(directory, name)
+
+            start_time = time.perf_counter()
+            save(persons, path) if save is save_persons else save(path)
+            save_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            loaded_persons: List[Person] = load(path)
+            load_time = time.perf_counter() - start_time
+
+            round_trip_ok: bool = all(
+                person.full_name == loaded_person.full_name and person.balance == loaded_person.balance
+                for person, loaded_person in zip(persons, loaded_persons)
+            )
+            print(f"{name:>6}: save {save_time:.3f} s, load {load_time:.3f} s ({nr_of_persons / load_time:,.0f} persons/s), {os.path.getsize(path) / 1e6:.1f} MB, round trip ok: {round_trip_ok}")
+
+
+def benchmark_import(nr_of_rows: int) -> None:
+    '''
+    Measure how fast persons are read from .csv and .jsonl files and hired into a company,
+    how much memory reading takes, and what that means for a 5 GB export
+    '''
+    first_names: List[str] = ["Mathias", "Tobias", "Rasmus", "Frank"]
+    job_names: List[str] = list(JOB_NAMES)
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path: str = os.path.join(directory, "persons.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["first_name", "last_name", "age", "balance", "job"])
+            writer.writerows([first_names[index % 4], f"Nr. {index % 1000}", 18 + index % 60, index % 100_000, job_names[index % 3]] for index in range(nr_of_rows))
+
+        jsonl_path: str = os.path.join(directory, "persons.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as file:
+            for index in range(nr_of_rows):
+                file.write(json.dumps({"first_name": first_names[index % 4], "last_name": f"Nr. {index % 1000}", "age": 18 + index % 60, "balance": index % 100_000, "job": job_names[index % 3]}) + "\n")
+
+        for path in [csv_path, jsonl_path]:
+            nr_of_bytes: int = os.path.getsize(path)
+
+            start_time = time.perf_counter()
+            nr_of_records: int = sum(len(records) for records in read_person_records(path))
+            read_time = time.perf_counter() - start_time
+
+            tracemalloc.start()
+            for _ in read_person_records(path):
+                pass
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            company = Company("import")
+            start_time = time.perf_counter()
+            import_into_company(company, path)
+            import_time = time.perf_counter() - start_time
+
+            print(f"{os.path.basename(path):>13}: {nr_of_bytes / 1e6:.0f} MB, read {nr_of_records / read_time:,.0f} records/s ({nr_of_bytes / 1e6 / read_time:.1f} MB/s), "
+                  f"peak {peak_memory / 1e6:.1f} MB, import {len(company) / import_time:,.0f} persons/s, 5 GB would take about {5e9 / (nr_of_bytes / import_time) / 60:.1f} min")
+
+
+def benchmark_journal(nr_of_accounts: int, nr_of_deltas: int) -> None:
+    '''
+    Measure how many balance changes per second the journal can log, with and without fsync,
+    and how long it takes to recover all accounts from a snapshot and a log of nr_of_deltas changes
+    '''
+    for fsync in [False, True]:
+        with tempfile.TemporaryDirectory() as directory:
+            journal = BalanceJournal(directory, fsync=fsync)
+            start_time = time.perf_counter()
+            for index in range(nr_of_deltas):
+                journal.record(index % nr_of_accounts, 1.0)
+            journal.flush()
+            record_time = time.perf_counter() - start_time
+            journal.close()
+            print(f"fsync {str(fsync):>5}: {nr_of_deltas / record_time:,.0f} deltas/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = BalanceJournal(directory, fsync=False)
+        journal.snapshot(array("d", bytes(8 * nr_of_accounts)))
+        for index in range(nr_of_deltas):
+            journal.record(index * 7 % nr_of_accounts, 1.0)
+        journal.close()
+
+        start_time = time.perf_counter()
+        balances: array = BalanceJournal.recover(directory)
+        recover_time = time.perf_counter() - start_time
+        print(f"recovered {len(balances):,} accounts and replayed {nr_of_deltas:,} deltas in {recover_time:.3f} s, total {sum(balances):,.0f}")
+
+
+
+
+if __name__ == "__main__":
+    person_list: List[Person] = [
+        Person("Mathias", "Grønne", 29),
+        Person("Tobias", "Nielsen", 35),
+        Person("Rasmus", "Pedersen", 24),
+        Person("Frank", "Olesen", 32)
+    ]
+
+    webshop = WebshopCompany("webshop", ["Pant", "Shirt"])
+    webshop.hire(person_list[0], CEO)
+    webshop.hire(person_list[1], Programmer)
+    webshop.hire(person_list[2], Programmer)
+    webshop.pay_salery()
+
+    with tempfile.TemporaryDirectory() as directory:
+        company_path: str = os.path.join(directory, "webshop.ida")
+        save_company(webshop, company_path)
+        loaded_webshop: Company = load_company(company_path)
+
+    print(loaded_webshop)
+    print(loaded_webshop._persons_in_company[0])
+
+    benchmark_save_and_load(1_000_000)
+
+    with tempfile.TemporaryDirectory() as directory:
+        persons_path: str = os.path.join(directory, "persons.ida")
+        save_persons([Person("Mathias", "Grønne", 18 + index % 60) for index in range(1_000_000)], persons_path)
+
+        with MappedPersonStore(persons_path, writable=True) as store:
+            print(len(store.older_than(30)))
+            store[0].give_salery(45_000)
+            print(store[0])
+
+        nr_of_workers: int = 4
+        chunk_size: int = 1_000_000 // nr_of_workers
+        with ProcessPoolExecutor(nr_of_workers) as process_pool:
+            counts = process_pool.map(
+                count_older_than_in_file,
+                [persons_path] * nr_of_workers,
+                [30] * nr_of_workers,
+                range(0, 1_000_000, chunk_size),
+                range(chunk_size, 1_000_000 + chunk_size, chunk_size),
+            )
+            print(sum(counts))
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = BalanceJournal(directory)
+        journal.attach(person_list)
+        person_list[3].give_salery(1_000)
+        journal.snapshot([person.balance for person in person_list])
+        person_list[3].spend_money(250)
+        person_list[0].give_salery(500)
+        journal.close()
+
+        recovered_balances: array = BalanceJournal.recover(directory)
+        print(list(recovered_balances) == [person.balance for person in person_list])
+
+    benchmark_journal(10_000_000, 1_000_000)
+
+    with tempfile.TemporaryDirectory() as directory:
+        hr_export_path: str = os.path.join(directory, "hr_export.csv")
+        with open(hr_export_path, "w", encoding="utf-8") as file:
+            file.write("first_name,last_name,age,job\nMathias,Grønne,29,CEO\nTobias,Nielsen,35,Programmer\n")
+        print(import_into_company(webshop, hr_export_path))
+    print(webshop)
+
+    benchmark_import(1_000_000)
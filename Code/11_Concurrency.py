@@ -0,0 +1,551 @@
+from __future__ import annotations
+from typing import Iterator, List, Sequence, Type
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+import copy
+import math
+import os
+import threading
+import time
+
+
+class Person:
+    '''
+    The balance of a person can be changed from many threads at once. Every change
+    takes one of a fixed set of locks, picked from the identity of the person, so
+    threads paying different persons seldom wait for each other, while a balance
+    is never changed by two threads at the same time
+    '''
+    _balance_locks: List[threading.Lock] = [threading.Lock() for _ in range(64)]
+
+    def __init__(self, first_name: str, last_name: str, age: int = 25):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.age = age
+        self._balance: float = 0.0
+        self._balance_lock: threading.Lock = Person._pick_balance_lock(self)
+        self._job_type: IJob = Unemployed()
+
+
+    @property
+    def job_type(self) -> IJob:
+        return self._job_type
+
+
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def full_name(self) -> str:
+        '''
+        Get the person's full name. It is only built again after a name has changed
+        '''
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
+
+
+    @staticmethod
+    def _pick_balance_lock(person: Person) -> threading.Lock:
+        # Objects are 16 byte aligned, so the lowest bits of id() are always 0
+        return Person._balance_locks[(id(person) >> 4) % len(Person._balance_locks)]
+
+
+    def __getstate__(self) -> dict:
+        '''
+        Locks can not be pickled, so a person sent to another process picks a new one there
+        '''
+        state: dict = self.__dict__.copy()
+        del state["_balance_lock"]
+        return state
+
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._balance_lock = Person._pick_balance_lock(self)
+
+
+    @property
+    def balance(self) -> float:
+        '''
+        Get how much money the person got in the bank
+        '''
+        with self._balance_lock:
+            return self._balance
+    
+
+    def spend_money(self, amount: float) -> None:
+        '''
+        The person used this amount of money
+        '''
+        if amount > 0:
+            with self._balance_lock:
+                self._balance -= amount
+
+
+    def give_salery(self, amount: float) -> None:
+        '''
+        The Person recieved the given amount of salery
+        '''
+        if amount > 0:
+            with self._balance_lock:
+                self._balance += amount 
+
+
+    def set_job(self, job: IJob) -> None:
+        self._job_type = job
+
+    
+    @property
+    def is_adult(self) -> bool:
+        '''
+        Check if the person is an adult
+        '''
+        return self.age > 0
+    
+
+    @property
+    def info_as_string(self) -> str:
+        '''
+        Get info as a string
+        '''
+        string: str = f"Person\n"
+        string += f"  Name: {self.full_name}\n"
+        string += f"  Age: {self.age}\n"
+        string += f"  Balance: {self.balance}\n"
+        return string
+    
+
+    def __str__(self) -> str:
+        return self.info_as_string
+    
+
+    def __eq__(self, ref_person: Person) -> bool:
+        return self.full_name == ref_person.full_name and self.age == ref_person.age
+    
+
+    def __gt__(self, ref_person: Person) -> bool:
+        return self.age > ref_person.age
+    
+
+    def __hash__(self) -> hash:
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
+
+
+
+    
+class Company:
+    _nr_of_companies_created: int = 0
+
+    def __init__(self, name: str):
+        self.name = name
+
+        self._persons_in_company: List[Person] = []
+
+        Company._nr_of_companies_created += 1
+        self._company_id: int = Company._nr_of_companies_created
+
+
+    @property
+    def company_id(self) -> int:
+        return self._company_id
+
+
+
+    def hire(self, person: Person, job_type: Type[IJob]) -> None:
+        '''
+        Hire a person to the company
+        '''
+        person.set_job(job_type())
+        self._persons_in_company += [person]
+
+    
+    def pay_salery(self) -> None:
+        '''
+        Pay salery to personnel
+        '''
+        for person in self._persons_in_company:
+            person.give_salery(person.job_type.salery)
+
+
+    @staticmethod
+    def total_nr_of_created_companies() -> int:
+        return Company._nr_of_companies_created
+    
+
+    def __len__(self) -> int:
+        return len(self._persons_in_company)
+    
+
+    def __str__(self) -> str:
+        string: str = f"Company\n"
+        string += f"  Name: {self.name}\n"
+        string += f"  Workers: {len(self)}"
+        return string
+    
+    
+
+
+
+class WebshopCompany(Company):
+    def __init__(self, name: str, products: List[str]):
+        super().__init__(name)
+        self._products = products
+
+
+    @property
+    def products(self) -> List[str]:
+        return self._products
+    
+
+    def __str__(self) -> str:
+        string = super().__str__()
+        string += f"  Products: {self.products}\n"
+        return string
+
+
+
+class IJob:
+    def __init__(self):
+        pass
+    
+    
+    def do_work(self) -> None:
+        raise NotImplementedError("do_work() not implemented")
+
+
+    @property
+    def salery(self) -> float:
+        raise NotImplementedError("salery() not implemented")    
+
+
+    
+
+class CEO(IJob):
+    def __init__(self):
+        self._salery: float = 75_000
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Creating a strategy or something")
+
+
+
+
+
+class Programmer(IJob):
+    def __init__(self):
+        self._salery: float = 45_000
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Making some code")
+
+
+
+
+class Unemployed(IJob):
+    def __init__(self):
+        self._salery: float = 0
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Searching for work")
+
+
+
+
+
+
+
+@dataclass
+class ShardResult:
+    '''
+    What paying one shard of a company gave: how much salery was paid and,
+    when the shard was paid in another process, the salery given at each
+    position of the shard, which is still to be given to the real persons
+    '''
+    salery_paid: float
+    saleries: array = None
+
+
+@dataclass
+class PayrollResult:
+    nr_of_persons: int
+    nr_of_shards: int
+    salery_paid: float
+    seconds: float
+
+
+def split_into_shards(company: Company, nr_of_shards: int) -> List[Company]:
+    '''
+    Split the company into shards with about the same number of persons.
+    A shard is a shallow copy of the company, so it is of the same type and pays
+    salery the same way, but with only a slice of the personnel
+    '''
+    persons: List[Person] = company._persons_in_company
+    shard_size: int = max(1, math.ceil(len(persons) / nr_of_shards))
+    shards: List[Company] = []
+    for start in range(0, len(persons), shard_size):
+        shard: Company = copy.copy(company)
+        shard._persons_in_company = persons[start:start + shard_size]
+        shards.append(shard)
+    return shards
+
+
+class _SaleryRecorder:
+    '''
+    Stands in for a person during a pay run and records the salery the person is given.
+    The salery is only passed on to the person when give_to_person is True
+    '''
+    def __init__(self, person: Person, give_to_person: bool):
+        self._person = person
+        self._give_to_person = give_to_person
+        self.salery_received: float = 0.0
+
+
+    def give_salery(self, amount: float) -> None:
+        if amount > 0:
+            self.salery_received += amount
+            if self._give_to_person:
+                self._person.give_salery(amount)
+
+
+    def __getattr__(self, name: str):
+        return getattr(self._person, name)
+
+
+def _pay_shard(shard: Company, in_other_process: bool) -> ShardResult:
+    '''
+    Pay the shard and record what every person in it was given. In another process the
+    persons are only copies, so the saleries are sent back instead of given to them
+    '''
+    recorders: List[_SaleryRecorder] = [_SaleryRecorder(person, not in_other_process) for person in shard._persons_in_company]
+    recording_shard: Company = copy.copy(shard)
+    recording_shard._persons_in_company = recorders
+    recording_shard.pay_salery()
+    saleries = array("d", [recorder.salery_received for recorder in recorders])
+    return ShardResult(math.fsum(saleries), saleries if in_other_process else None)
+
+
+class PayrollExecutor:
+    '''
+    Pay salery to the personnel of a company in shards, either one after another ("serial"),
+    on a thread pool ("thread") or on a process pool ("process").
+    Every shard is paid with its own pay_salery, so a WebshopCompany is paid like a WebshopCompany.
+    A process pays copies of the persons, so the salery given to each is sent back and given to
+    the real persons in shard order. The result is the same whatever the mode and the number of workers
+    '''
+    MODES: List[str] = ["serial", "thread", "process"]
+
+    def __init__(self, mode: str = "thread", nr_of_workers: int = None):
+        if mode not in PayrollExecutor.MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {PayrollExecutor.MODES}")
+        self._mode = mode
+        self._nr_of_workers: int = nr_of_workers or os.cpu_count() or 1
+        self._executor: Executor = None
+        if mode == "thread":
+            self._executor = ThreadPoolExecutor(self._nr_of_workers)
+        elif mode == "process":
+            self._executor = ProcessPoolExecutor(self._nr_of_workers)
+
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+
+    @property
+    def nr_of_workers(self) -> int:
+        return self._nr_of_workers
+
+
+    def _run_shards(self, shards: List[Company]) -> Iterator[ShardResult]:
+        if self._executor is None:
+            return map(_pay_shard, shards, [False] * len(shards))
+        return self._executor.map(_pay_shard, shards, [self._mode == "process"] * len(shards))
+
+
+    def pay_salery(self, company: Company, nr_of_shards: int = None) -> PayrollResult:
+        '''
+        Pay salery to the personnel of the company, split into nr_of_shards shards.
+        There is one shard per worker by default
+        '''
+        start_time = time.perf_counter()
+        shards: List[Company] = split_into_shards(company, nr_of_shards or self._nr_of_workers)
+
+        salery_paid: List[float] = []
+        for shard, result in zip(shards, self._run_shards(shards)):
+            if result.saleries is not None:
+                for person, salery in zip(shard._persons_in_company, result.saleries):
+                    person.give_salery(salery)
+            salery_paid.append(result.salery_paid)
+
+        return PayrollResult(len(company), len(shards), math.fsum(salery_paid), time.perf_counter() - start_time)
+
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+    def __enter__(self) -> PayrollExecutor:
+        return self
+
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+
+
+def benchmark_payroll_executor(nr_of_persons: int, worker_counts: Sequence[int]) -> None:
+    '''
+    Compare paying salery serially, on threads and on processes with different numbers of workers.
+    The balances after every pay run are checked against those of the serial run
+    '''
+    def create_company() -> Company:
+        company = WebshopCompany("webshop", ["Pant", "Shirt"])
+        for index in range(nr_of_persons):
+            company.hire(Person("Mathias", f"Nr. {index}", 18 + index % 60), [CEO, Programmer, Unemployed][index % 3])
+        return company
+
+    print(f"{os.cpu_count()} cores available")
+
+    serial_company: Company = create_company()
+    with PayrollExecutor("serial") as executor:
+        serial_result: PayrollResult = executor.pay_salery(serial_company)
+    expected_balances: List[float] = [person.balance for person in serial_company._persons_in_company]
+    print(f" serial: {serial_result.seconds:.3f} s, {nr_of_persons / serial_result.seconds:,.0f} persons/s")
+
+    for mode in ["thread", "process"]:
+        for nr_of_workers in worker_counts:
+            company: Company = create_company()
+            with PayrollExecutor(mode, nr_of_workers) as executor:
+                result: PayrollResult = executor.pay_salery(company)
+            same_as_serial: bool = result.salery_paid == serial_result.salery_paid and [person.balance for person in company._persons_in_company] == expected_balances
+            print(f"{mode:>7} x {nr_of_workers:>2}: {result.seconds:.3f} s, {nr_of_persons / result.seconds:,.0f} persons/s, "
+                  f"speedup {serial_result.seconds / result.seconds:.2f}, same as serial: {same_as_serial}")
+
+
+def benchmark_balance_updates(nr_of_persons: int, nr_of_updates: int, thread_counts: Sequence[int]) -> None:
+    '''
+    Let threads give salery to the same persons at once, with no lock, with one lock
+    for all persons and with the striped locks of Person, and check that no salery is lost.
+    Then pay the persons on a process pool while another thread gives them bonuses
+    '''
+    global_lock = threading.Lock()
+
+    class UnlockedPerson(Person):
+        def give_salery(self, amount: float) -> None:
+            self._balance += amount
+
+    class GloballyLockedPerson(Person):
+        def give_salery(self, amount: float) -> None:
+            with global_lock:
+                self._balance += amount
+
+    for person_type in [UnlockedPerson, GloballyLockedPerson, Person]:
+        for nr_of_threads in thread_counts:
+            persons: List[Person] = [person_type("Mathias", f"Nr. {index}") for index in range(nr_of_persons)]
+            updates_per_thread: int = nr_of_updates // nr_of_threads
+
+            def give_salery_many_times(offset: int) -> None:
+                for index in range(offset, offset + updates_per_thread):
+                    persons[index % nr_of_persons].give_salery(1)
+
+            threads: List[threading.Thread] = [threading.Thread(target=give_salery_many_times, args=(thread_nr,)) for thread_nr in range(nr_of_threads)]
+            start_time = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds: float = time.perf_counter() - start_time
+
+            lost_salery: float = updates_per_thread * nr_of_threads - sum(person.balance for person in persons)
+            print(f"{person_type.__name__:>20} x {nr_of_threads:>2} threads: {updates_per_thread * nr_of_threads / seconds:,.0f} updates/s, lost salery: {lost_salery:,.0f}")
+
+    company = Company("payroll")
+    persons = [Person("Mathias", f"Nr. {index}") for index in range(nr_of_persons)]
+    for person in persons:
+        company.hire(person, Programmer)
+    nr_of_bonuses: List[int] = [0]
+    payroll_done = threading.Event()
+
+    def give_bonuses() -> None:
+        while not payroll_done.is_set():
+            persons[nr_of_bonuses[0] % nr_of_persons].give_salery(1)
+            nr_of_bonuses[0] += 1
+
+    bonus_thread = threading.Thread(target=give_bonuses)
+    bonus_thread.start()
+    with PayrollExecutor("process", 2) as executor:
+        result: PayrollResult = executor.pay_salery(company)
+    payroll_done.set()
+    bonus_thread.join()
+    lost_salery = result.salery_paid + nr_of_bonuses[0] - sum(person.balance for person in persons)
+    print(f"Process payroll while another thread gives {nr_of_bonuses[0]:,} bonuses: lost salery: {lost_salery:,.0f}")
+
+
+
+
+if __name__ == "__main__":
+    person_list: List[Person] = [
+        Person("Mathias", "Grønne", 29),
+        Person("Tobias", "Nielsen", 35),
+        Person("Rasmus", "Pedersen", 24),
+        Person("Frank", "Olesen", 32)
+    ]
+
+    webshop = WebshopCompany("webshop", ["Pant", "Shirt"])
+    webshop.hire(person_list[0], CEO)
+    webshop.hire(person_list[1], Programmer)
+    webshop.hire(person_list[2], Programmer)
+
+    with PayrollExecutor("process", 2) as payroll_executor:
+        print(payroll_executor.pay_salery(webshop))
+    for person in person_list:
+        print(person)
+
+    benchmark_payroll_executor(200_000, [1, 2, 4, 8, 16, 32, 64])
+
+    benchmark_balance_updates(1_000, 2_000_000, [1, 4, 16, 64])
@@ -1,38 +1,248 @@
 from __future__ import annotations
 from typing import Dict, List
+from types import MethodType
+import functools
+import random
+import threading
 import time
 
 
+class TimingStats:
+    '''
+    Statistics of the run times of a single function. The histogram is
+    HDR-style: every power of two is split into 16 buckets, so a recorded
+    time is never off by more than about 6%.
+    When only some calls are timed, calls counts all of them and count only
+    the timed ones, and the reported total is scaled up to match
+    '''
+    _sub_buckets: int = 16
+
+    def __init__(self, name: str):
+        self.name = name
+        self.reset()
+
+
+    def reset(self) -> None:
+        self.calls: int = 0
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.min_ns: int = None
+        self.max_ns: int = None
+        self._histogram: Dict[int, int] = {}
+
+
+    @staticmethod
+    def _bucket_of(time_ns: int) -> int:
+        sub_buckets: int = TimingStats._sub_buckets
+        if time_ns < 2 * sub_buckets:
+            return time_ns
+        shift: int = time_ns.bit_length() - sub_buckets.bit_length()
+        return shift * sub_buckets + (time_ns >> shift)
+
+
+    @staticmethod
+    def _lowest_time_in_bucket(bucket: int) -> int:
+        sub_buckets: int = TimingStats._sub_buckets
+        if bucket < 2 * sub_buckets:
+            return bucket
+        shift: int = bucket // sub_buckets - 1
+        return (bucket - shift * sub_buckets) << shift
+
+
+    def add(self, time_ns: int) -> None:
+        '''
+        Record a single run time
+        '''
+        self.count += 1
+        self.total_ns += time_ns
+        if self.min_ns is None or time_ns < self.min_ns:
+            self.min_ns = time_ns
+        if self.max_ns is None or time_ns > self.max_ns:
+            self.max_ns = time_ns
+        bucket: int = TimingStats._bucket_of(time_ns)
+        self._histogram[bucket] = self._histogram.get(bucket, 0) + 1
+
+
+    def merge(self, other: TimingStats) -> None:
+        '''
+        Add the statistics of another recording of the same function
+        '''
+        self.calls += other.calls
+        self.count += other.count
+        self.total_ns += other.total_ns
+        if other.min_ns is not None and (self.min_ns is None or other.min_ns < self.min_ns):
+            self.min_ns = other.min_ns
+        if other.max_ns is not None and (self.max_ns is None or other.max_ns > self.max_ns):
+            self.max_ns = other.max_ns
+        for bucket, bucket_count in dict(other._histogram).items():
+            self._histogram[bucket] = self._histogram.get(bucket, 0) + bucket_count
+
+
+    def percentile(self, percent: float) -> int:
+        '''
+        Get the run time that the given percent of the calls were faster than
+        '''
+        calls_to_pass: float = self.count * percent / 100
+        calls_passed: int = 0
+        for bucket in sorted(self._histogram):
+            calls_passed += self._histogram[bucket]
+            if calls_passed >= calls_to_pass:
+                return TimingStats._lowest_time_in_bucket(bucket)
+        return self.max_ns
+
+
+    def __str__(self) -> str:
+        if self.count == 0:
+            return f"{self.name}: no calls\n"
+        string: str = f"{self.name}\n"
+        if self.calls == self.count:
+            string += f"  Calls: {self.calls}\n"
+        else:
+            string += f"  Calls: {self.calls} ({self.count} timed)\n"
+        string += f"  Total: {self.total_ns * self.calls / self.count / 1e6:.3f} ms\n"
+        string += f"  Mean: {self.total_ns / self.count:.0f} ns\n"
+        string += f"  Min: {self.min_ns} ns, Max: {self.max_ns} ns\n"
+        string += f"  p50: {self.percentile(50)} ns, p99: {self.percentile(99)} ns\n"
+        return string
+
+
+
+
+class TimingRegistry:
+    '''
+    Keeps the statistics of every timed function. Set enabled to False to
+    turn all timing off, after which a timed call only costs a flag check.
+    Every thread records into its own statistics, which are merged on read,
+    so timed calls from several threads never wait for each other
+    '''
+    enabled: bool = True
+    _stats: Dict[str, List[TimingStats]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def register(name: str) -> None:
+        with TimingRegistry._lock:
+            if name not in TimingRegistry._stats:
+                TimingRegistry._stats[name] = []
+
+
+    @staticmethod
+    def new_thread_stats(name: str) -> TimingStats:
+        '''
+        Create the statistics that a single thread records into
+        '''
+        stats = TimingStats(name)
+        with TimingRegistry._lock:
+            TimingRegistry._stats[name] = TimingRegistry._stats.get(name, []) + [stats]
+        return stats
+
+
+    @staticmethod
+    def stats_for(name: str) -> TimingStats:
+        '''
+        Get the statistics of a function merged across all threads
+        '''
+        merged_stats = TimingStats(name)
+        for thread_stats in TimingRegistry._stats.get(name, []):
+            merged_stats.merge(thread_stats)
+        return merged_stats
+    
+
+    @staticmethod
+    def report() -> str:
+        '''
+        Get a report of every timed function
+        '''
+        return "".join(str(TimingRegistry.stats_for(name)) for name in list(TimingRegistry._stats))
+
+
+    @staticmethod
+    def reset() -> None:
+        for all_thread_stats in list(TimingRegistry._stats.values()):
+            for thread_stats in all_thread_stats:
+                thread_stats.reset()
+
+
+
+
 class TimeDecorator:
-    def __init__(self, func):
+    def __init__(self, func=None, sample_every: int = 1, sample_probability: float = 1.0):
+        """
+        Time every sample_every'th call, each with the given probability.
+        Without func it can be used as @TimeDecorator(sample_every=100)
+        """
+        if sample_every < 1:
+            raise ValueError(f"sample_every must be at least 1, got {sample_every}")
+        if not 0.0 < sample_probability <= 1.0:
+            raise ValueError(f"sample_probability must be above 0 and at most 1, got {sample_probability}")
         self.func = func
+        self.sample_every = sample_every
+        self.sample_probability = sample_probability
+        self._thread_local = threading.local()
+        if func is not None:
+            TimingRegistry.register(func.__qualname__)
 
     def __get__(self, instance, owner):
         """
         Descriptor method to ensure the function is bound to the instance.
         This allows `self` to be passed automatically.
         """
-        return lambda *args, **kwargs: self(instance, *args, **kwargs)
+        if instance is None:
+            return self
+        if not TimingRegistry.enabled:
+            return self.func.__get__(instance, owner)
+        return MethodType(self, instance)
+
+    def __set_name__(self, owner, name):
+        """
+        Put a plain function in the class instead of the decorator, so looking
+        up the method does not go through __get__ on every call
+        """
+        setattr(owner, name, _flag_checked(self))
+
+    def _thread_stats(self) -> TimingStats:
+        try:
+            return self._thread_local.stats
+        except AttributeError:
+            self._thread_local.stats = TimingRegistry.new_thread_stats(self.func.__qualname__)
+            return self._thread_local.stats
 
     def __call__(self, *args, **kwargs):
-        start_time = time.time()
-        result = self.func(*args, **kwargs)
-        end_time = time.time()
-        print(f"Time: {end_time - start_time:.4f} seconds")
-        return result
+        if self.func is None:
+            return TimeDecorator(args[0], self.sample_every, self.sample_probability)
+        if not TimingRegistry.enabled:
+            return self.func(*args, **kwargs)
+        stats = self._thread_stats()
+        stats.calls += 1
+        if stats.calls % self.sample_every or (self.sample_probability < 1.0 and random.random() >= self.sample_probability):
+            return self.func(*args, **kwargs)
+        start_time = time.perf_counter_ns()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            stats.add(time.perf_counter_ns() - start_time)
     
 
 
-def time_decorator(func):
+def _flag_checked(timer: TimeDecorator):
+    '''
+    Wrap the timer in a plain function that calls the undecorated function while timing is disabled
+    '''
+    func = timer.func
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)  # Pass all arguments to the wrapped function
-        end_time = time.time()
-        print(f"Time: {end_time - start_time:.4f} seconds")
-        return result
+        if not TimingRegistry.enabled:
+            return func(*args, **kwargs)
+        return timer(*args, **kwargs)  # Pass all arguments to the wrapped function
     return wrapper
 
 
+def time_decorator(func=None, sample_every: int = 1, sample_probability: float = 1.0):
+    if func is None:
+        return lambda func: time_decorator(func, sample_every, sample_probability)
+    return _flag_checked(TimeDecorator(func, sample_every, sample_probability))
+
+
 
 class Person:
 
@@ -43,12 +253,38 @@ class Person:
         self._balance: float = 0.0
 
 
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
     @property
     def full_name(self) -> str:
         '''
-        Get the person's full name
+        Get the person's full name. It is only built again after a name has changed
         '''
-        return f"{self.first_name} {self.last_name}"
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
 
 
     @property
@@ -59,7 +295,7 @@ class Person:
         return self._balance
     
 
-    @TimeDecorator
+    @TimeDecorator(sample_every=10)
     def spend_money(self, amount: float) -> None:
         '''
         The person used this amount of money
@@ -109,7 +345,9 @@ class Person:
     
 
     def __hash__(self) -> hash:
-        return hash(self.full_name)
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
     
 
 
@@ -145,6 +383,7 @@ class Company:
         self._persons_in_company += [person]
 
     
+    @TimeDecorator(sample_probability=0.5)
     def pay_salery(self) -> None:
         '''
         Pay salery to personnel
@@ -199,10 +438,64 @@ person_to_age[person_a] = person_a.age
 
 print(person_to_age[person_a])
 
+person_a.last_name = "Pedersen"
+print(person_a.full_name)
+print(person_a in person_to_age)
+
+
+
+def benchmark_person_keys(nr_of_persons: int) -> None:
+    '''
+    Time dict and set operations with persons as keys
+    '''
+    persons: List[Person] = [Person("Mathias", f"Grønne {index}", 29) for index in range(nr_of_persons)]
+
+    start_time = time.perf_counter()
+    person_to_age: Dict[Person, int] = {person: person.age for person in persons}
+    insert_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for person in persons:
+        person_to_age[person]
+    lookup_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    person_set = set(persons)
+    for person in persons:
+        person in person_set
+    set_time = time.perf_counter() - start_time
+
+    print(f"Dict insert: {insert_time / nr_of_persons * 1e9:.1f} ns per person")
+    print(f"Dict lookup: {lookup_time / nr_of_persons * 1e9:.1f} ns per person")
+    print(f"Set build and lookup: {set_time / nr_of_persons * 1e9:.1f} ns per person")
+
+
+# Try benchmark_person_keys(1_000_000) for a larger run
+benchmark_person_keys(10_000)
+
 
 person_a.spend_money(50)
 person_a.spend_money(-50)
 
+def spend_all_the_money() -> None:
+    for _ in range(100_000):
+        person_a.spend_money(1)
+
+spenders: List[threading.Thread] = [threading.Thread(target=spend_all_the_money) for _ in range(4)]
+for spender in spenders:
+    spender.start()
+for spender in spenders:
+    spender.join()
+
+for _ in range(1000):
+    company_a.pay_salery()
+
+print(TimingRegistry.report())
+
+TimingRegistry.enabled = False
+person_a.spend_money(50)
+TimingRegistry.enabled = True
+
 
 
 class AddMoreEachTime:
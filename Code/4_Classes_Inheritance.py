@@ -1,5 +1,8 @@
 from __future__ import annotations
-from typing import Any, Dict, Generic, List, TypeVar
+from typing import Any, Deque, Dict, Generic, Iterable, List, TypeVar
+from collections import deque
+import asyncio
+import threading
 import time
 
 
@@ -12,12 +15,38 @@ class Person:
         self._balance: float = 0.0
 
 
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
     @property
     def full_name(self) -> str:
         '''
-        Get the person's full name
+        Get the person's full name. It is only built again after a name has changed
         '''
-        return f"{self.first_name} {self.last_name}"
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
 
 
     @property
@@ -77,7 +106,9 @@ class Person:
     
 
     def __hash__(self) -> hash:
-        return hash(self.full_name)
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
 
 
 
@@ -169,27 +200,57 @@ print(webshop.total_nr_of_created_companies())
 T = TypeVar("T")
 class FirstInFirstOut(Generic[T]):
     def __init__(self):
-        self._element_list: List[T] = []
+        self._elements: Deque[T] = deque()
 
     
     def __len__(self) -> int:
-        return len(self._element_list)
+        return len(self._elements)
     
 
     def add(self, element: T) -> None:
-        self._element_list += [element]
+        self._elements.append(element)
+
+
+    def add_many(self, elements: Iterable[T]) -> None:
+        '''
+        Add all the given elements to the back of the queue
+        '''
+        self._elements.extend(elements)
 
     
     def get(self) -> T:
         if len(self) == 0:
             return None
-        first_element: T = self._element_list[0]
-        self._element_list = self._element_list[1:]
-        return first_element
+        return self._elements.popleft()
+
+
+    def get_many(self, n: int) -> List[T]:
+        '''
+        Get up to n elements from the front of the queue
+        '''
+        pop_first = self._elements.popleft
+        return [pop_first() for _ in range(min(n, len(self)))]
     
 
 
 
+def benchmark_fifo_drain(sizes: List[int]) -> None:
+    '''
+    Time how long it takes to drain a queue of each size
+    '''
+    for size in sizes:
+        queue = FirstInFirstOut[int]()
+        queue.add_many(range(size))
+
+        start_time = time.perf_counter()
+        while len(queue):
+            queue.get()
+        drain_time = time.perf_counter() - start_time
+
+        print(f"Drained {size:>10} elements in {drain_time:.4f} seconds ({drain_time / size * 1e9:.1f} ns per element)")
+
+
+
 queue_in_tivoli = FirstInFirstOut[Person]()
 
 print(f"N Persons in queye: {len(queue_in_tivoli)}")
@@ -208,6 +269,148 @@ print(queue_in_tivoli.get())
 print(queue_in_tivoli.get())
 
 
+queue_in_tivoli.add_many([Person("Rasmus", "Pedersen", 24), Person("Frank", "Olesen", 32), Person("Mathias", "Grønne", 29)])
+print(f"N Persons in queye: {len(queue_in_tivoli)}")
+
+for person in queue_in_tivoli.get_many(2):
+    print(person.full_name)
+
+print(f"N Persons in queye: {len(queue_in_tivoli)}")
+
+
+# The full comparison takes a while and a lot of memory: benchmark_fifo_drain([10_000, 100_000, 1_000_000, 10_000_000])
+benchmark_fifo_drain([1_000, 10_000, 100_000])
+
+
+
+
+class BlockingFirstInFirstOut(FirstInFirstOut[T]):
+    def __init__(self, max_size: int = 0):
+        super().__init__()
+        self._max_size: int = max_size
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+
+    @property
+    def is_full(self) -> bool:
+        return 0 < self._max_size <= len(self._elements)
+    
+
+    def add(self, element: T, timeout: float = None) -> None:
+        '''
+        Add an element, waiting for room if the queue is full
+        '''
+        self.add_many([element], timeout)
+
+
+    def add_many(self, elements: Iterable[T], timeout: float = None) -> None:
+        '''
+        Add all the given elements, waiting for room whenever the queue is full
+        '''
+        with self._not_full:
+            for element in elements:
+                if not self._not_full.wait_for(lambda: not self.is_full, timeout):
+                    raise TimeoutError("The queue is still full")
+                self._elements.append(element)
+                self._not_empty.notify()
+
+    
+    def get(self, timeout: float = None) -> T:
+        '''
+        Get the first element, waiting for one if the queue is empty.
+        Returns None if the timeout runs out
+        '''
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: len(self._elements) > 0, timeout):
+                return None
+            first_element: T = self._elements.popleft()
+            self._not_full.notify()
+            return first_element
+
+
+    def get_many(self, n: int) -> List[T]:
+        '''
+        Get up to n elements from the front of the queue without waiting
+        '''
+        with self._lock:
+            elements: List[T] = super().get_many(n)
+            self._not_full.notify(len(elements))
+            return elements
+
+
+
+
+class AsyncFirstInFirstOut(Generic[T]):
+    def __init__(self, max_size: int = 0):
+        self._queue: asyncio.Queue[T] = asyncio.Queue(max_size)
+
+    
+    def __len__(self) -> int:
+        return self._queue.qsize()
+    
+
+    async def put(self, element: T, timeout: float = None) -> None:
+        '''
+        Add an element, waiting for room if the queue is full
+        '''
+        await asyncio.wait_for(self._queue.put(element), timeout)
+
+
+    async def get(self, timeout: float = None) -> T:
+        '''
+        Get the first element, waiting for one if the queue is empty.
+        Returns None if the timeout runs out
+        '''
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+
+
+tivoli_company = Company("Tivoli", 30000)
+hiring_queue = BlockingFirstInFirstOut[Person](max_size=2)
+
+def send_applicants(applicants: List[Person]) -> None:
+    hiring_queue.add_many(applicants)
+
+def hire_applicants() -> None:
+    while (applicant := hiring_queue.get(timeout=0.5)) is not None:
+        tivoli_company.hire(applicant)
+
+workers: List[threading.Thread] = [
+    threading.Thread(target=send_applicants, args=([Person("Mathias", "Grønne", 29), Person("Tobias", "Nielsen", 35)],)),
+    threading.Thread(target=send_applicants, args=([Person("Rasmus", "Pedersen", 24), Person("Frank", "Olesen", 32)],)),
+    threading.Thread(target=hire_applicants)
+]
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+
+print(f"Nr. of persons hired: {len(tivoli_company)}")
+
+
+async def hire_applicants_async() -> None:
+    async_hiring_queue = AsyncFirstInFirstOut[Person](max_size=1)
+
+    async def send(applicants: List[Person]) -> None:
+        for applicant in applicants:
+            await async_hiring_queue.put(applicant)
+
+    async def hire() -> None:
+        while (applicant := await async_hiring_queue.get(timeout=0.5)) is not None:
+            tivoli_company.hire(applicant)
+
+    await asyncio.gather(send([Person("Mathias", "Grønne", 29)]), send([Person("Tobias", "Nielsen", 35)]), hire())
+
+asyncio.run(hire_applicants_async())
+print(f"Nr. of persons hired: {len(tivoli_company)}")
+
+
 
 
 class PersonFIFO(FirstInFirstOut[Person]):
@@ -1,16 +1,23 @@
 from __future__ import annotations
-from typing import Any, Dict, Generic, List, Type, TypeVar
+from typing import Any, Dict, Generic, List, Tuple, Type, TypeVar
 import time
+import tracemalloc
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Person:
+    _payrolls: Tuple[Tuple[PayrollEngine, int], ...] = ()
 
     def __init__(self, first_name: str, last_name: str, age: int = 25):
         self.first_name = first_name
         self.last_name = last_name
         self.age = age
         self._balance: float = 0.0
-        self._job_type: IJob = Unemployed()
+        self._job_type: IJob = JobRegistry.get(Unemployed)
 
 
     @property
@@ -18,12 +25,38 @@ class Person:
         return self._job_type
 
 
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
     @property
     def full_name(self) -> str:
         '''
-        Get the person's full name
+        Get the person's full name. It is only built again after a name has changed
         '''
-        return f"{self.first_name} {self.last_name}"
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
 
 
     @property
@@ -31,6 +64,8 @@ class Person:
         '''
         Get how much money the person got in the bank
         '''
+        for payroll, slot in self._payrolls:
+            payroll.sync_slot(slot)
         return self._balance
     
 
@@ -52,6 +87,8 @@ class Person:
 
     def set_job(self, job: IJob) -> None:
         self._job_type = job
+        for payroll, slot in self._payrolls:
+            payroll.set_job(slot, job)
 
     
     @property
@@ -87,7 +124,38 @@ class Person:
     
 
     def __hash__(self) -> hash:
-        return hash(self.full_name)
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
+
+
+
+
+class CompactPerson:
+    '''
+    A Person without a per-instance __dict__. The methods and properties are
+    shared with Person, only the storage of the fields is different
+    '''
+    __slots__ = ("_first_name", "_last_name", "_full_name", "_hash", "age", "_balance", "_job_type", "_payrolls")
+
+    def __init__(self, first_name: str, last_name: str, age: int = 25):
+        Person.__init__(self, first_name, last_name, age)
+        self._payrolls: Tuple[Tuple[PayrollEngine, int], ...] = ()
+
+    job_type = Person.job_type
+    first_name = Person.first_name
+    last_name = Person.last_name
+    full_name = Person.full_name
+    balance = Person.balance
+    spend_money = Person.spend_money
+    give_salery = Person.give_salery
+    set_job = Person.set_job
+    is_adult = Person.is_adult
+    info_as_string = Person.info_as_string
+    __str__ = Person.__str__
+    __eq__ = Person.__eq__
+    __gt__ = Person.__gt__
+    __hash__ = Person.__hash__
 
 
 
@@ -95,10 +163,11 @@ class Person:
 class Company:
     _nr_of_companies_created: int = 0
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, use_payroll_engine: bool = False):
         self.name = name
 
         self._persons_in_company: List[Person] = []
+        self._payroll_engine: PayrollEngine = PayrollEngine() if use_payroll_engine else None
 
         Company._nr_of_companies_created += 1
         self._company_id: int = Company._nr_of_companies_created
@@ -114,14 +183,19 @@ class Company:
         '''
         Hire a person to the company
         '''
-        person.set_job(job_type())
+        person.set_job(JobRegistry.get(job_type))
         self._persons_in_company += [person]
+        if self._payroll_engine is not None:
+            self._payroll_engine.add(person)
 
     
     def pay_salery(self) -> None:
         '''
         Pay salery to personnel
         '''
+        if self._payroll_engine is not None:
+            self._payroll_engine.pay_salery()
+            return
         for person in self._persons_in_company:
             person.give_salery(person.job_type.salery)
 
@@ -146,8 +220,8 @@ class Company:
 
 
 class WebshopCompany(Company):
-    def __init__(self, name: str, products: List[str]):
-        super().__init__(name)
+    def __init__(self, name: str, products: List[str], use_payroll_engine: bool = False):
+        super().__init__(name, use_payroll_engine)
         self._products = products
 
 
@@ -180,8 +254,7 @@ class IJob:
     
 
 class CEO(IJob):
-    def __init__(self):
-        self._salery: float = 75_000
+    _salery: float = 75_000
 
     
     @property
@@ -197,8 +270,7 @@ class CEO(IJob):
 
 
 class Programmer(IJob):
-    def __init__(self):
-        self._salery: float = 45_000
+    _salery: float = 45_000
 
     
     @property
@@ -213,8 +285,7 @@ class Programmer(IJob):
 
 
 class Unemployed(IJob):
-    def __init__(self):
-        self._salery: float = 0
+    _salery: float = 0
 
     
     @property
@@ -227,6 +298,161 @@ class Unemployed(IJob):
 
 
 
+
+class JobRegistry:
+    '''
+    Hands out one shared instance per job type. The salery is held by the job
+    class, so changing it here changes it for everyone with that job
+    '''
+    _jobs: Dict[Type[IJob], IJob] = {}
+    _job_ids: Dict[Type[IJob], int] = {}
+
+    @staticmethod
+    def get(job_type: Type[IJob]) -> IJob:
+        '''
+        Get the shared instance of the job type
+        '''
+        job: IJob = JobRegistry._jobs.get(job_type)
+        if job is None:
+            job = job_type()
+            JobRegistry._job_ids[job_type] = len(JobRegistry._jobs)
+            JobRegistry._jobs[job_type] = job
+        return job
+    
+
+    @staticmethod
+    def job_id(job_type: Type[IJob]) -> int:
+        '''
+        Get the id of the job type, which is its index in saleries()
+        '''
+        JobRegistry.get(job_type)
+        return JobRegistry._job_ids[job_type]
+    
+
+    @staticmethod
+    def saleries() -> List[float]:
+        '''
+        Get the salery of every registered job type, ordered by job id
+        '''
+        return [job.salery for job in JobRegistry._jobs.values()]
+
+
+    @staticmethod
+    def set_salery(job_type: Type[IJob], salery: float) -> None:
+        '''
+        Change the salery of everyone with the job type
+        '''
+        job_type._salery = salery
+
+
+
+
+class PayrollEngine:
+    '''
+    Columnar payroll where every hired person gets a slot in a set of NumPy arrays.
+    A pay run is a single vectorized add into the pending balances, which are
+    only moved into Person._balance once the person's balance is read
+    '''
+    _initial_capacity: int = 1024
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("The payroll engine requires numpy")
+
+        self._persons: List[Person] = []
+        self._job_ids = np.zeros(PayrollEngine._initial_capacity, dtype=np.intp)
+        self._pending_balances = np.zeros(PayrollEngine._initial_capacity)
+
+
+    def __len__(self) -> int:
+        return len(self._persons)
+    
+
+    def add(self, person: Person) -> None:
+        '''
+        Give the person a slot in the payroll
+        '''
+        slot: int = len(self._persons)
+        if slot == len(self._job_ids):
+            self._job_ids = np.resize(self._job_ids, 2 * slot)
+            self._pending_balances = np.resize(self._pending_balances, 2 * slot)
+
+        self._persons += [person]
+        self._pending_balances[slot] = 0
+        person._payrolls += ((self, slot),)
+        self.set_job(slot, person.job_type)
+
+
+    def set_job(self, slot: int, job: IJob) -> None:
+        '''
+        Set the job of the person in the slot
+        '''
+        self._job_ids[slot] = JobRegistry.job_id(type(job))
+
+
+    def pay_salery(self) -> None:
+        '''
+        Pay salery to everyone in the payroll in one vectorized add.
+        Like give_salery, only positive amounts are paid out
+        '''
+        size: int = len(self._persons)
+        saleries = np.maximum(np.array(JobRegistry.saleries(), dtype=float), 0)
+        self._pending_balances[:size] += saleries[self._job_ids[:size]]
+
+
+    def sync_slot(self, slot: int) -> None:
+        '''
+        Move the pending balance of a single slot into its person
+        '''
+        pending_balance: float = float(self._pending_balances[slot])
+        if pending_balance:
+            self._persons[slot]._balance += pending_balance
+            self._pending_balances[slot] = 0
+
+
+    def sync(self) -> None:
+        '''
+        Move all pending balances into their persons
+        '''
+        for slot in np.flatnonzero(self._pending_balances[:len(self._persons)]).tolist():
+            self.sync_slot(slot)
+
+
+
+
+def benchmark_payroll(nr_of_persons: int, nr_of_pay_runs: int) -> None:
+    '''
+    Compare the time of the plain and the vectorized payroll
+    '''
+    for use_payroll_engine in [False, True]:
+        company = Company("Benchmark Company", use_payroll_engine)
+        for index in range(nr_of_persons):
+            company.hire(Person("Mathias", "Grønne", 29), CEO if index % 10 == 0 else Programmer)
+
+        start_time = time.perf_counter()
+        for _ in range(nr_of_pay_runs):
+            company.pay_salery()
+        pay_time = time.perf_counter() - start_time
+
+        print(f"Payroll engine: {use_payroll_engine}, {nr_of_pay_runs} pay runs of {nr_of_persons} persons in {pay_time:.4f} seconds")
+
+
+
+
+def benchmark_person_memory(nr_of_persons: int) -> None:
+    '''
+    Compare the bytes allocated per Person and per CompactPerson
+    '''
+    for person_type in [Person, CompactPerson]:
+        tracemalloc.start()
+        persons = [person_type("Mathias", "Grønne", 29) for _ in range(nr_of_persons)]
+        allocated_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{person_type.__name__}: {allocated_bytes / len(persons):.1f} bytes per person")
+
+
+
     
     
 
@@ -262,3 +488,29 @@ print(person_a)
 print(person_b)
 
 
+if np is not None:
+    vectorized_webshop = WebshopCompany("Vectorized webshop", ["Pant", "Shirt"], use_payroll_engine=True)
+
+    person_c = Person("Rasmus", "Pedersen", 24)
+    vectorized_webshop.hire(person_c, Programmer)
+    vectorized_webshop.pay_salery()
+    vectorized_webshop.pay_salery()
+    person_c.spend_money(1000)
+
+    print(person_c)
+
+    # Try benchmark_payroll(nr_of_persons=1_000_000, nr_of_pay_runs=10) for a larger run
+    benchmark_payroll(nr_of_persons=10_000, nr_of_pay_runs=10)
+
+
+compact_person = CompactPerson("Frank", "Olesen", 32)
+webshop.hire(compact_person, Programmer)
+webshop.pay_salery()
+print(compact_person)
+
+print(person_a.job_type is JobRegistry.get(Programmer))
+JobRegistry.set_salery(Programmer, 50_000)
+print(person_a.job_type.salery)
+
+# Try benchmark_person_memory(nr_of_persons=1_000_000) for a larger run
+benchmark_person_memory(nr_of_persons=10_000)
@@ -1,9 +1,22 @@
 from __future__ import annotations
-from typing import Any, Dict, Generic, List, Type, TypeVar
+from typing import Any, Callable, Dict, Generic, Iterable, List, Set, Tuple, Type, TypeVar
+from operator import attrgetter
+from bisect import bisect_left
+from itertools import count
+import heapq
+import random
 import time
+import weakref
 
 
 class Person:
+    '''
+    Persons are ordered by age only, while two persons are only equal when both
+    their full name and age are the same. So a <= b and a >= b just means that
+    a and b have the same age, not that a == b
+    '''
+    _watchers: Tuple[Any, ...] = ()
+    sort_key = attrgetter("_age")
 
     def __init__(self, first_name: str, last_name: str, age: int = 25):
         self.first_name = first_name
@@ -18,12 +31,51 @@ class Person:
         return self._job_type
 
 
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+        self._notify_watchers()
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+        self._notify_watchers()
+
+
+    @property
+    def age(self) -> int:
+        return self._age
+    
+
+    @age.setter
+    def age(self, age: int) -> None:
+        self._age: int = age
+        self._notify_watchers()
+
+
     @property
     def full_name(self) -> str:
         '''
-        Get the person's full name
+        Get the person's full name. It is only built again after a name has changed
         '''
-        return f"{self.first_name} {self.last_name}"
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
 
 
     @property
@@ -40,6 +92,7 @@ class Person:
         '''
         if amount > 0:
             self._balance -= amount
+            self._notify_watchers()
 
 
     def give_salery(self, amount: float) -> None:
@@ -48,10 +101,20 @@ class Person:
         '''
         if amount > 0:
             self._balance += amount 
+            self._notify_watchers()
 
 
     def set_job(self, job: IJob) -> None:
         self._job_type = job
+        self._notify_watchers()
+
+
+    def _notify_watchers(self) -> None:
+        '''
+        Let everything that keeps track of the person know that the person changed
+        '''
+        for watcher in self._watchers:
+            watcher._person_changed(self)
 
     
     @property
@@ -79,15 +142,39 @@ class Person:
     
 
     def __eq__(self, ref_person: Person) -> bool:
+        if not isinstance(ref_person, Person):
+            return NotImplemented
         return self.full_name == ref_person.full_name and self.age == ref_person.age
     
 
+    def __lt__(self, ref_person: Person) -> bool:
+        if not isinstance(ref_person, Person):
+            return NotImplemented
+        return self._age < ref_person._age
+    
+
+    def __le__(self, ref_person: Person) -> bool:
+        if not isinstance(ref_person, Person):
+            return NotImplemented
+        return self._age <= ref_person._age
+    
+
     def __gt__(self, ref_person: Person) -> bool:
-        return self.age > ref_person.age
+        if not isinstance(ref_person, Person):
+            return NotImplemented
+        return self._age > ref_person._age
+    
+
+    def __ge__(self, ref_person: Person) -> bool:
+        if not isinstance(ref_person, Person):
+            return NotImplemented
+        return self._age >= ref_person._age
     
 
     def __hash__(self) -> hash:
-        return hash(self.full_name)
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
 
 
 
@@ -226,6 +313,349 @@ class Unemployed(IJob):
         print("Searching for work")
 
 
+class PersonSortView:
+    '''
+    Sorts a list of persons by one of their fields, like "full_name", "age"
+    or "balance". The keys of every field are extracted once and cached, and
+    only the keys of persons that changed since the last sort are extracted again.
+    The persons only hold a weak reference to the view, so a view that is
+    dropped without close() stops being notified
+    '''
+    def __init__(self, persons: Iterable[Person]):
+        self._persons: List[Person] = list(persons)
+        self._positions: Dict[int, List[int]] = {}
+        self._key_columns: Dict[str, List[Any]] = {}
+        self._changed_positions: Dict[str, Set[int]] = {}
+        self._sort_orders: Dict[Tuple[str, bool], List[int]] = {}
+        self._watcher = _WeakWatcher(self)
+
+        for position, person in enumerate(self._persons):
+            if id(person) not in self._positions:
+                self._positions[id(person)] = []
+                person._watchers += (self._watcher,)
+            self._positions[id(person)] += [position]
+
+
+    def __len__(self) -> int:
+        return len(self._persons)
+    
+
+    def sorted_by(self, field: str, reverse: bool = False) -> List[Person]:
+        '''
+        Get the persons sorted by the field
+        '''
+        key_column: List[Any] = self._key_column(field)
+        sort_order: List[int] = self._sort_orders.get((field, reverse))
+        if sort_order is None:
+            sort_order = sorted(range(len(self._persons)), key=key_column.__getitem__, reverse=reverse)
+            self._sort_orders[(field, reverse)] = sort_order
+        return [self._persons[position] for position in sort_order]
+
+
+    def close(self) -> None:
+        '''
+        Stop keeping track of changes to the persons
+        '''
+        for person in self._persons:
+            person._watchers = tuple(watcher for watcher in person._watchers if watcher is not self._watcher)
+
+
+    def __enter__(self) -> PersonSortView:
+        return self
+
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+    def _key_column(self, field: str) -> List[Any]:
+        if field not in self._key_columns:
+            self._key_columns[field] = list(map(attrgetter(field), self._persons))
+            self._changed_positions[field] = set()
+            return self._key_columns[field]
+
+        key_column: List[Any] = self._key_columns[field]
+        changed_positions: Set[int] = self._changed_positions[field]
+        if changed_positions:
+            get_key = attrgetter(field)
+            for position in changed_positions:
+                key_column[position] = get_key(self._persons[position])
+            changed_positions.clear()
+            for reverse in [False, True]:
+                sort_order: List[int] = self._sort_orders.get((field, reverse))
+                if sort_order is not None:
+                    sort_order.sort(key=key_column.__getitem__, reverse=reverse)
+        return key_column
+
+
+    def _person_changed(self, person: Person) -> None:
+        for changed_positions in self._changed_positions.values():
+            changed_positions.update(self._positions[id(person)])
+
+
+
+
+class _WeakWatcher:
+    '''
+    Passes changes on to a watcher without keeping it alive. Once the watcher
+    is gone, it removes itself from the next person that changes
+    '''
+    __slots__ = ("_watcher",)
+
+    def __init__(self, watcher: Any):
+        self._watcher = weakref.ref(watcher)
+
+
+    def _person_changed(self, person: Person) -> None:
+        watcher: Any = self._watcher()
+        if watcher is None:
+            person._watchers = tuple(other_watcher for other_watcher in person._watchers if other_watcher is not self)
+        else:
+            watcher._person_changed(person)
+
+
+
+
+class SortedRoster:
+    '''
+    Persons kept sorted by a single field, found with binary search.
+    Every key is stored together with a sequence number given when the person
+    was added, so even among many equal keys a person's exact place is found
+    by binary search, and equal keys stay in the order they were added
+    '''
+    def __init__(self, field: str):
+        self._get_key = attrgetter(field)
+        self._keys: List[Tuple[Any, int]] = []
+        self.persons: List[Person] = []
+        self._key_of: Dict[int, Tuple[Any, int]] = {}
+        self._sequence_numbers = count()
+
+
+    def __len__(self) -> int:
+        return len(self.persons)
+    
+
+    def add(self, person: Person) -> None:
+        key: Tuple[Any, int] = (self._get_key(person), next(self._sequence_numbers))
+        position: int = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self.persons.insert(position, person)
+        self._key_of[id(person)] = key
+
+
+    def remove(self, person: Person) -> None:
+        position: int = bisect_left(self._keys, self._key_of.pop(id(person)))
+        del self._keys[position]
+        del self.persons[position]
+
+
+    def update(self, person: Person) -> None:
+        '''
+        Move the person to their new place if their key has changed
+        '''
+        if self._get_key(person) != self._key_of[id(person)][0]:
+            self.remove(person)
+            self.add(person)
+
+
+    def resort(self) -> None:
+        '''
+        Sort all persons again by their current keys. Faster than moving
+        every person one by one when most of the keys have changed
+        '''
+        keys: List[Tuple[Any, int]] = [(self._get_key(person), self._key_of[id(person)][1]) for person in self.persons]
+        sort_order: List[int] = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys[:] = [keys[position] for position in sort_order]
+        self.persons[:] = [self.persons[position] for position in sort_order]
+        for person, key in zip(self.persons, self._keys):
+            self._key_of[id(person)] = key
+
+
+    def first(self) -> Person:
+        return self.persons[0] if self.persons else None
+    
+
+    def last(self) -> Person:
+        return self.persons[-1] if self.persons else None
+
+
+
+
+class SortedCompany(Company):
+    '''
+    A company that keeps its personnel sorted by each of the given fields,
+    so the youngest, oldest, poorest and richest are always at hand.
+    The order follows along when a person's age or balance changes
+    '''
+    def __init__(self, name: str, sorted_by: Tuple[str, ...] = ("age", "balance")):
+        super().__init__(name)
+        self._rosters: Dict[str, SortedRoster] = {field: SortedRoster(field) for field in sorted_by}
+        self._persons_in_company = self._rosters[sorted_by[0]].persons
+        self._paying_salery: bool = False
+
+
+    def hire(self, person: Person, job_type: Type[IJob]) -> None:
+        '''
+        Hire a person to the company
+        '''
+        person.set_job(job_type())
+        if self in person._watchers:
+            return
+        person._watchers += (self,)
+        for roster in self._rosters.values():
+            roster.add(person)
+
+
+    def fire(self, person: Person) -> None:
+        '''
+        Fire a person from the company
+        '''
+        if self not in person._watchers:
+            return
+        person._watchers = tuple(watcher for watcher in person._watchers if watcher is not self)
+        for roster in self._rosters.values():
+            roster.remove(person)
+
+    
+    def pay_salery(self) -> None:
+        '''
+        Pay salery to personnel. Nobody is moved during the pay run,
+        instead every roster is sorted once afterwards
+        '''
+        self._paying_salery = True
+        try:
+            for person in self._persons_in_company:
+                person.give_salery(person.job_type.salery)
+        finally:
+            self._paying_salery = False
+            for roster in self._rosters.values():
+                roster.resort()
+
+
+    def sorted_by(self, field: str) -> List[Person]:
+        return list(self._rosters[field].persons)
+    
+
+    def lowest(self, field: str) -> Person:
+        return self._rosters[field].first()
+    
+
+    def highest(self, field: str) -> Person:
+        return self._rosters[field].last()
+    
+
+    @property
+    def youngest(self) -> Person:
+        return self.lowest("age")
+    
+
+    @property
+    def oldest(self) -> Person:
+        return self.highest("age")
+    
+
+    @property
+    def poorest(self) -> Person:
+        return self.lowest("balance")
+    
+
+    @property
+    def richest(self) -> Person:
+        return self.highest("balance")
+
+
+    def _person_changed(self, person: Person) -> None:
+        if self._paying_salery:
+            return
+        for roster in self._rosters.values():
+            roster.update(person)
+
+
+
+
+def top_k(persons: Iterable[Person], k: int, key: Callable[[Person], Any]) -> List[Person]:
+    '''
+    Get the k persons with the largest key, largest first.
+    Uses a heap of size k instead of sorting everyone
+    '''
+    return heapq.nlargest(k, persons, key=key)
+
+
+def bottom_k(persons: Iterable[Person], k: int, key: Callable[[Person], Any]) -> List[Person]:
+    '''
+    Get the k persons with the smallest key, smallest first
+    '''
+    return heapq.nsmallest(k, persons, key=key)
+
+
+def min_max(persons: Iterable[Person], key: Callable[[Person], Any]) -> Tuple[Person, Person]:
+    '''
+    Get the persons with the smallest and the largest key in a single pass,
+    calling key only once per person
+    '''
+    persons = iter(persons)
+    min_person = max_person = next(persons, None)
+    if min_person is None:
+        raise ValueError("min_max() arg is an empty iterable")
+    min_key = max_key = key(min_person)
+    for person in persons:
+        person_key = key(person)
+        if person_key < min_key:
+            min_person, min_key = person, person_key
+        elif person_key > max_key:
+            max_person, max_key = person, person_key
+    return min_person, max_person
+
+
+def sort_persons(persons: Iterable[Person], reverse: bool = False) -> List[Person]:
+    '''
+    Sort the persons in their natural order, by age. Gives the same result as
+    sorted(persons), but the keys are read in C by Person.sort_key instead
+    of comparing the persons with __lt__
+    '''
+    return sorted(persons, key=Person.sort_key, reverse=reverse)
+
+
+def benchmark_natural_sort(nr_of_persons: int) -> None:
+    '''
+    Compare sorting by the comparison methods with sorting by Person.sort_key
+    '''
+    persons: List[Person] = [Person("Mathias", "Grønne", random.randint(18, 80)) for _ in range(nr_of_persons)]
+
+    start_time = time.perf_counter()
+    sorted(persons)
+    print(f"sorted(persons): {time.perf_counter() - start_time:.4f} seconds for {nr_of_persons} persons")
+
+    start_time = time.perf_counter()
+    sort_persons(persons)
+    print(f"sort_persons(persons): {time.perf_counter() - start_time:.4f} seconds for {nr_of_persons} persons")
+
+
+def benchmark_top_k(nr_of_persons: int, k: int) -> None:
+    '''
+    Compare top_k, bottom_k and min_max with sorted, max and min
+    '''
+    persons: List[Person] = [Person("Mathias", "Grønne", random.randint(18, 80)) for _ in range(nr_of_persons)]
+    for person in persons:
+        person.give_salery(random.uniform(0, 100_000))
+    by_balance = lambda person: person.balance
+
+    timings: List[Tuple[str, Callable[[], Any]]] = [
+        ("sorted()[-k:]", lambda: sorted(persons, key=by_balance)[-k:]),
+        ("top_k", lambda: top_k(persons, k, by_balance)),
+        ("sorted()[:k]", lambda: sorted(persons, key=by_balance)[:k]),
+        ("bottom_k", lambda: bottom_k(persons, k, by_balance)),
+        ("min() and max()", lambda: (min(persons, key=by_balance), max(persons, key=by_balance))),
+        ("min_max", lambda: min_max(persons, by_balance)),
+    ]
+    for name, function in timings:
+        start_time = time.perf_counter()
+        function()
+        print(f"{name}: {time.perf_counter() - start_time:.4f} seconds for {nr_of_persons} persons")
+
+
+
+
 number_list: List[int] = [1, 6, 3, 8, 3, 1, 5, 4]
 
 max_value: int = max(number_list)
@@ -276,4 +706,46 @@ print("-------------------")
 print(max(person_list, key=lambda person: person.age))
 print(min(person_list, key=lambda person: person.age))
 
+print("-------------------")
+
+for person in top_k(person_list, 2, key=lambda person: person.balance):
+    print(person.full_name)
+
+for person in bottom_k(person_list, 2, key=lambda person: person.age):
+    print(person.full_name)
+
+youngest_person, oldest_person = min_max(person_list, key=lambda person: person.age)
+print(f"Youngest: {youngest_person.full_name}, Oldest: {oldest_person.full_name}")
+
+# Try benchmark_top_k(nr_of_persons=1_000_000, k=100) for a larger run
+benchmark_top_k(nr_of_persons=10_000, k=100)
+
+print(person_list[0] <= person_list[1], person_list[0] >= person_list[1])
+print([person.full_name for person in sort_persons(person_list)])
+# Try benchmark_natural_sort(nr_of_persons=1_000_000) for a larger run
+benchmark_natural_sort(nr_of_persons=10_000)
+
+print("-------------------")
+
+with PersonSortView(person_list) as dashboard:
+    print([person.full_name for person in dashboard.sorted_by("full_name")])
+    print([person.full_name for person in dashboard.sorted_by("balance", reverse=True)])
+
+    person_list[0].give_salery(100_000)
+    print([person.full_name for person in dashboard.sorted_by("balance", reverse=True)])
+    print([person.full_name for person in dashboard.sorted_by("age")])
+
+print("-------------------")
+
+sorted_company = SortedCompany("Sorted Company")
+for person in person_list:
+    sorted_company.hire(person, Programmer)
+
+print(f"Oldest: {sorted_company.oldest.full_name}, Youngest: {sorted_company.youngest.full_name}")
+print(f"Richest: {sorted_company.richest.full_name}")
+
+person_list[3].give_salery(500_000)
+print(f"Richest: {sorted_company.richest.full_name}")
 
+sorted_company.fire(person_list[1])
+print(f"Oldest: {sorted_company.oldest.full_name}, Workers: {len(sorted_company)}")
@@ -1,9 +1,17 @@
 from __future__ import annotations
-from typing import Any, Dict, Generic, List, Type, TypeVar
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Tuple, Type, TypeVar
+from itertools import islice
+import random
 import time
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Person:
+    _employers: Tuple[Company, ...] = ()
 
     def __init__(self, first_name: str, last_name: str, age: int = 25):
         self.first_name = first_name
@@ -18,12 +26,51 @@ class Person:
         return self._job_type
 
 
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+        self._notify_employers()
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+        self._notify_employers()
+
+
+    @property
+    def age(self) -> int:
+        return self._age
+    
+
+    @age.setter
+    def age(self, age: int) -> None:
+        self._age: int = age
+        self._notify_employers()
+
+
     @property
     def full_name(self) -> str:
         '''
-        Get the person's full name
+        Get the person's full name. It is only built again after a name has changed
         '''
-        return f"{self.first_name} {self.last_name}"
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
 
 
     @property
@@ -40,6 +87,8 @@ class Person:
         '''
         if amount > 0:
             self._balance -= amount
+            for company in self._employers:
+                company._balance_changed(self._balance + amount, self._balance)
 
 
     def give_salery(self, amount: float) -> None:
@@ -48,10 +97,21 @@ class Person:
         '''
         if amount > 0:
             self._balance += amount 
+            for company in self._employers:
+                company._balance_changed(self._balance - amount, self._balance)
 
 
     def set_job(self, job: IJob) -> None:
         self._job_type = job
+        self._notify_employers()
+
+
+    def _notify_employers(self) -> None:
+        '''
+        Let the companies the person works for know that the person changed
+        '''
+        for company in self._employers:
+            company._update_indexes(self)
 
     
     @property
@@ -87,18 +147,34 @@ class Person:
     
 
     def __hash__(self) -> hash:
-        return hash(self.full_name)
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
 
 
 
     
 class Company:
     _nr_of_companies_created: int = 0
+    _age_group_size: int = 10
 
     def __init__(self, name: str):
         self.name = name
 
-        self._persons_in_company: List[Person] = []
+        # Employees are keyed by id(), as two different persons may have the same name and age
+        self._persons_in_company: Dict[int, Person] = {}
+        self._persons_by_name: Dict[str, List[Person]] = {}
+        self._persons_by_job: Dict[Type[IJob], Dict[int, Person]] = {}
+        self._persons_by_age_group: Dict[int, Dict[int, Person]] = {}
+        self._indexed_as: Dict[int, Tuple[str, int, Type[IJob], float]] = {}
+
+        self._head_count_by_job: Dict[Type[IJob], int] = {}
+        self._salery_by_job: Dict[Type[IJob], float] = {}
+        # The balance sums are kept relative to the first balance counted, so the
+        # variance stays precise when balances are large but close together
+        self._balance_shift: float = None
+        self._shifted_balance_sum: float = 0.0
+        self._shifted_balance_square_sum: float = 0.0
 
         Company._nr_of_companies_created += 1
         self._company_id: int = Company._nr_of_companies_created
@@ -112,17 +188,221 @@ class Company:
 
     def hire(self, person: Person, job_type: Type[IJob]) -> None:
         '''
-        Hire a person to the company
+        Hire a person to the company. Hiring someone who already works
+        here only gives them the new job
         '''
+        already_employed: bool = person in self
         person.set_job(job_type())
-        self._persons_in_company += [person]
+        if already_employed:
+            return
+        person._employers += (self,)
+        self._add_to_indexes(person)
+
+
+    def hire_many(self, persons: Iterable[Person], job_type: Type[IJob]) -> None:
+        '''
+        Hire all the persons to the company with the same job. They share a
+        single job instance and the indexes are updated once for the batch
+        '''
+        job: IJob = job_type()
+        new_persons: Dict[int, Person] = {}
+        for person in persons:
+            if id(person) in new_persons:
+                continue
+            already_employed: bool = id(person) in self._persons_in_company
+            person.set_job(job)
+            if already_employed:
+                continue
+            person._employers += (self,)
+            new_persons[id(person)] = person
+        self._add_many_to_indexes(new_persons)
+
+
+    def hire_from_stream(self, persons: Iterable[Person], job_type: Type[IJob], batch_size: int = 10_000) -> None:
+        '''
+        Hire the persons from an iterator or generator in batches of batch_size,
+        so only one batch is held in memory at a time
+        '''
+        persons = iter(persons)
+        while batch := list(islice(persons, batch_size)):
+            self.hire_many(batch, job_type)
+
+
+    def fire(self, person: Person) -> None:
+        '''
+        Fire a person from the company. They become unemployed unless they
+        work for another company
+        '''
+        if person not in self:
+            return
+        self._remove_from_indexes(person)
+        person._employers = tuple(company for company in person._employers if company is not self)
+        if not person._employers:
+            person.set_job(Unemployed())
+
+
+    def find_by_name(self, full_name: str) -> List[Person]:
+        '''
+        Get the employees with the given full name
+        '''
+        return list(self._persons_by_name.get(full_name, []))
+    
+
+    def employees_with_job(self, job_type: Type[IJob]) -> List[Person]:
+        '''
+        Get the employees with the given job
+        '''
+        return list(self._persons_by_job.get(job_type, {}).values())
+    
+
+    def employees_aged(self, min_age: int, max_age: int) -> List[Person]:
+        '''
+        Get the employees from min_age to max_age, both included
+        '''
+        return [
+            person
+            for age_group in range(min_age // Company._age_group_size, max_age // Company._age_group_size + 1)
+            for person in self._persons_by_age_group.get(age_group, {}).values()
+            if min_age <= person.age <= max_age
+        ]
+
+
+    def head_count(self, job_type: Type[IJob]) -> int:
+        '''
+        Get the number of employees with the given job
+        '''
+        return self._head_count_by_job.get(job_type, 0)
+    
+
+    def salery_of_job(self, job_type: Type[IJob]) -> float:
+        '''
+        Get the salery paid to everyone with the given job in a pay run
+        '''
+        return self._salery_by_job.get(job_type, 0.0)
+    
+
+    @property
+    def total_salery(self) -> float:
+        '''
+        Get the salery paid to personnel in a pay run
+        '''
+        return sum(self._salery_by_job.values())
+    
+
+    @property
+    def total_balance(self) -> float:
+        nr_of_persons: int = len(self._indexed_as)
+        return nr_of_persons * self._balance_shift + self._shifted_balance_sum if nr_of_persons else 0.0
+    
+
+    @property
+    def mean_balance(self) -> float:
+        nr_of_persons: int = len(self._indexed_as)
+        return self._balance_shift + self._shifted_balance_sum / nr_of_persons if nr_of_persons else 0.0
+    
+
+    @property
+    def balance_variance(self) -> float:
+        nr_of_persons: int = len(self._indexed_as)
+        if nr_of_persons == 0:
+            return 0.0
+        shifted_mean: float = self._shifted_balance_sum / nr_of_persons
+        return max(self._shifted_balance_square_sum / nr_of_persons - shifted_mean ** 2, 0.0)
+
+
+    def _add_to_indexes(self, person: Person) -> None:
+        self._add_many_to_indexes({id(person): person})
+
+
+    def _add_many_to_indexes(self, new_persons: Dict[int, Person]) -> None:
+        '''
+        Group the new persons first, so every index group is only updated once
+        '''
+        by_name: Dict[str, List[Person]] = {}
+        by_job: Dict[Type[IJob], Dict[int, Person]] = {}
+        by_age_group: Dict[int, Dict[int, Person]] = {}
+        for person_id, person in new_persons.items():
+            job_type: Type[IJob] = type(person.job_type)
+            by_name.setdefault(person.full_name, []).append(person)
+            by_job.setdefault(job_type, {})[person_id] = person
+            by_age_group.setdefault(person.age // Company._age_group_size, {})[person_id] = person
+            salery: float = person.job_type.salery if person.job_type.salery > 0 else 0.0
+            self._indexed_as[person_id] = (person.full_name, person.age, job_type, salery)
+            self._count_in_aggregates(job_type, salery, person.balance, 1)
+
+        self._persons_in_company.update(new_persons)
+        for full_name, persons in by_name.items():
+            self._persons_by_name.setdefault(full_name, []).extend(persons)
+        for index, new_groups in [(self._persons_by_job, by_job), (self._persons_by_age_group, by_age_group)]:
+            for index_key, persons in new_groups.items():
+                index.setdefault(index_key, {}).update(persons)
+
+
+    def _remove_from_indexes(self, person: Person) -> None:
+        '''
+        Remove the person as they were indexed, which may be under an old name, age or job
+        '''
+        full_name, age, job_type, salery = self._indexed_as.pop(id(person))
+        self._count_in_aggregates(job_type, salery, person.balance, -1)
+        if not self._indexed_as:
+            self._balance_shift = None
+            self._shifted_balance_sum = 0.0
+            self._shifted_balance_square_sum = 0.0
+        namesakes: List[Person] = self._persons_by_name[full_name]
+        del namesakes[next(position for position, namesake in enumerate(namesakes) if namesake is person)]
+        if not namesakes:
+            del self._persons_by_name[full_name]
+        Company._remove_from_index(self._persons_by_job, job_type, person)
+        Company._remove_from_index(self._persons_by_age_group, age // Company._age_group_size, person)
+        del self._persons_in_company[id(person)]
+
+
+    def _update_indexes(self, person: Person) -> None:
+        '''
+        Index the person again after their name, age or job has changed
+        '''
+        self._remove_from_indexes(person)
+        self._add_to_indexes(person)
+
+
+    def _count_in_aggregates(self, job_type: Type[IJob], salery: float, balance: float, sign: int) -> None:
+        '''
+        Add (sign 1) or remove (sign -1) a person from the running aggregates
+        '''
+        head_count: int = self._head_count_by_job.get(job_type, 0) + sign
+        if head_count:
+            self._head_count_by_job[job_type] = head_count
+            self._salery_by_job[job_type] = self._salery_by_job.get(job_type, 0.0) + sign * salery
+        else:
+            self._head_count_by_job.pop(job_type, None)
+            self._salery_by_job.pop(job_type, None)
+        if self._balance_shift is None:
+            self._balance_shift = balance
+        shifted_balance: float = balance - self._balance_shift
+        self._shifted_balance_sum += sign * shifted_balance
+        self._shifted_balance_square_sum += sign * shifted_balance * shifted_balance
+
+
+    def _balance_changed(self, old_balance: float, new_balance: float) -> None:
+        shifted_old_balance: float = old_balance - self._balance_shift
+        shifted_new_balance: float = new_balance - self._balance_shift
+        self._shifted_balance_sum += shifted_new_balance - shifted_old_balance
+        self._shifted_balance_square_sum += shifted_new_balance * shifted_new_balance - shifted_old_balance * shifted_old_balance
+
+
+    @staticmethod
+    def _remove_from_index(index: Dict[Any, Dict[int, Person]], index_key: Any, person: Person) -> None:
+        persons: Dict[int, Person] = index[index_key]
+        del persons[id(person)]
+        if not persons:
+            del index[index_key]
 
     
     def pay_salery(self) -> None:
         '''
         Pay salery to personnel
         '''
-        for person in self._persons_in_company:
+        for person in self._persons_in_company.values():
             person.give_salery(person.job_type.salery)
 
 
@@ -135,6 +415,10 @@ class Company:
         return len(self._persons_in_company)
     
 
+    def __contains__(self, person: Person) -> bool:
+        return id(person) in self._persons_in_company
+    
+
     def __str__(self) -> str:
         string: str = f"Company\n"
         string += f"  Name: {self.name}\n"
@@ -228,6 +512,174 @@ class Unemployed(IJob):
 
 
 
+class PersonQuery:
+    '''
+    A lazy query over persons, or over whatever a select() turned them into.
+    Nothing runs before the query is iterated, and then the source is streamed
+    through all the stages in a single pass without building lists in between.
+    Following where() stages are fused into one filter
+    '''
+    def __init__(self, source: Iterable[Any], stages: List[Tuple[str, Callable[[Any], Any]]] = None):
+        self._source = source
+        self._stages: List[Tuple[str, Callable[[Any], Any]]] = stages if stages is not None else []
+
+
+    def where(self, predicate: Callable[[Any], bool]) -> PersonQuery:
+        '''
+        Keep only the items the predicate is true for
+        '''
+        if self._stages and self._stages[-1][0] == "where":
+            previous_predicate: Callable[[Any], bool] = self._stages[-1][1]
+            fused_predicate: Callable[[Any], bool] = lambda item: previous_predicate(item) and predicate(item)
+            return PersonQuery(self._source, self._stages[:-1] + [("where", fused_predicate)])
+        return PersonQuery(self._source, self._stages + [("where", predicate)])
+    
+
+    def select(self, selector: Callable[[Any], Any]) -> PersonQuery:
+        '''
+        Turn every item into what the selector returns
+        '''
+        return PersonQuery(self._source, self._stages + [("select", selector)])
+    
+
+    def __iter__(self) -> Iterator[Any]:
+        items: Iterator[Any] = iter(self._source)
+        for stage, function in self._stages:
+            items = filter(function, items) if stage == "where" else map(function, items)
+        return items
+    
+
+    def to_dict(self, key: Callable[[Any], Any], value: Callable[[Any], Any]) -> Dict[Any, Any]:
+        return { key(item): value(item) for item in self }
+    
+
+    def to_list(self) -> List[Any]:
+        return list(self)
+    
+
+    def count(self) -> int:
+        return sum(1 for _ in self)
+
+
+
+
+class PersonTable:
+    '''
+    A snapshot of persons stored column by column in NumPy arrays, so filters
+    run as vectorized boolean masks instead of a Python loop over persons.
+    Names and jobs are stored as codes into lists of their distinct values
+    '''
+    def __init__(self, persons: Iterable[Person]):
+        if np is None:
+            raise ImportError("PersonTable requires numpy")
+
+        self._persons: List[Person] = list(persons)
+        self._first_name_codes: Dict[str, int] = {}
+        self._last_name_codes: Dict[str, int] = {}
+        self._job_codes: Dict[Type[IJob], int] = {}
+
+        nr_of_persons: int = len(self._persons)
+        self.ages = np.fromiter((person.age for person in self._persons), dtype=np.int32, count=nr_of_persons)
+        self.balances = np.fromiter((person.balance for person in self._persons), dtype=np.float64, count=nr_of_persons)
+        self.first_names = PersonTable._encode((person.first_name for person in self._persons), self._first_name_codes, nr_of_persons)
+        self.last_names = PersonTable._encode((person.last_name for person in self._persons), self._last_name_codes, nr_of_persons)
+        self.jobs = PersonTable._encode((type(person.job_type) for person in self._persons), self._job_codes, nr_of_persons)
+
+
+    @staticmethod
+    def _encode(values: Iterable[Any], codes: Dict[Any, int], nr_of_values: int) -> np.ndarray:
+        return np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int32, count=nr_of_values)
+    
+
+    @staticmethod
+    def _codes_in(column: np.ndarray, codes: Dict[Any, int], values: Iterable[Any]) -> np.ndarray:
+        '''
+        Mark the allowed codes in a small lookup table and look every row up in it
+        '''
+        is_allowed = np.zeros(len(codes), dtype=bool)
+        is_allowed[[codes[value] for value in values if value in codes]] = True
+        return is_allowed[column]
+    
+
+    def __len__(self) -> int:
+        return len(self._persons)
+    
+
+    def first_name_in(self, first_names: Iterable[str]) -> np.ndarray:
+        '''
+        Get the mask of the persons whose first name is one of the given
+        '''
+        return PersonTable._codes_in(self.first_names, self._first_name_codes, first_names)
+    
+
+    def last_name_in(self, last_names: Iterable[str]) -> np.ndarray:
+        '''
+        Get the mask of the persons whose last name is one of the given
+        '''
+        return PersonTable._codes_in(self.last_names, self._last_name_codes, last_names)
+    
+
+    def has_job(self, job_type: Type[IJob]) -> np.ndarray:
+        '''
+        Get the mask of the persons with the given job
+        '''
+        if job_type not in self._job_codes:
+            return np.zeros(len(self), dtype=bool)
+        return self.jobs == self._job_codes[job_type]
+    
+
+    def persons(self, mask: np.ndarray) -> List[Person]:
+        '''
+        Get the persons selected by the mask
+        '''
+        return [self._persons[index] for index in np.flatnonzero(mask).tolist()]
+    
+
+    def full_names(self, mask: np.ndarray) -> List[str]:
+        '''
+        Get the full names of the persons selected by the mask
+        '''
+        first_names: List[str] = list(self._first_name_codes)
+        last_names: List[str] = list(self._last_name_codes)
+        return [
+            f"{first_names[first_name]} {last_names[last_name]}"
+            for first_name, last_name in zip(self.first_names[mask].tolist(), self.last_names[mask].tolist())
+        ]
+    
+
+    def name_to_age(self, mask: np.ndarray) -> Dict[str, int]:
+        return dict(zip(self.full_names(mask), self.ages[mask].tolist()))
+
+
+
+
+def benchmark_person_table(nr_of_persons: int) -> None:
+    '''
+    Compare a dict comprehension with a PersonTable mask for the same filter
+    '''
+    first_names: List[str] = ["Mathias", "Tobias", "Rasmus", "Frank"]
+    persons: List[Person] = [Person(random.choice(first_names), f"Nr. {index}", random.randint(18, 80)) for index in range(nr_of_persons)]
+    allowed_names: List[str] = ["Mathias", "Tobias"]
+    table = PersonTable(persons)
+
+    start_time = time.perf_counter()
+    name_to_age = { person.full_name: person.age for person in persons if 34 > person.age > 25 and person.first_name in allowed_names }
+    comprehension_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    mask = (table.ages > 25) & (table.ages < 34) & table.first_name_in(allowed_names)
+    mask_time = time.perf_counter() - start_time
+    table_name_to_age = table.name_to_age(mask)
+    table_time = time.perf_counter() - start_time
+
+    print(f"Comprehension: {comprehension_time:.4f} seconds for {nr_of_persons} persons")
+    print(f"PersonTable mask: {mask_time:.4f} seconds ({comprehension_time / mask_time:.0f}x)")
+    print(f"PersonTable mask and dict: {table_time:.4f} seconds ({comprehension_time / table_time:.1f}x)")
+    print(f"Same result: {name_to_age == table_name_to_age}")
+
+
+
+
 person_list: List[Person] = [
     Person("Mathias", "Grønne", 29),
     Person("Tobias", "Nielsen", 35),
@@ -258,16 +710,44 @@ name_to_age_d: Dict[str, int] = { person.full_name: person.age for person in per
 print(name_to_age_d)
 
 
-person_list[0].set_job(CEO())
-person_list[1].set_job(Programmer())
-person_list[2].set_job(Programmer())
+everyone = Company("Everyone")
+everyone.hire(person_list[0], CEO)
+everyone.hire(person_list[1], Programmer)
+everyone.hire(person_list[2], Programmer)
+everyone.hire(person_list[3], Unemployed)
 
-name_to_age_e: Dict[str, int] = { person.full_name: person.age for person in person_list if isinstance(person.job_type, Programmer) }
+name_to_age_e: Dict[str, int] = { person.full_name: person.age for person in everyone.employees_with_job(Programmer) }
 print(name_to_age_e)
 
-name_to_age_f: Dict[str, int] = { person.full_name: person.age for person in person_list if isinstance(person.job_type, Unemployed) }
+name_to_age_f: Dict[str, int] = { person.full_name: person.age for person in everyone.employees_with_job(Unemployed) }
 print(name_to_age_f)
 
+print([person.full_name for person in everyone.find_by_name("Tobias Nielsen")])
+print([person.full_name for person in everyone.employees_aged(25, 33)])
+
+print("-----------------")
+
+name_to_age_g: Dict[str, int] = (
+    PersonQuery(person_list)
+    .where(lambda person: person.first_name in allowed_names)
+    .where(lambda person: person.age > 30)
+    .to_dict(key=lambda person: person.full_name, value=lambda person: person.age)
+)
+print(name_to_age_g)
+
+print(PersonQuery(person_list).where(lambda person: 34 > person.age > 25).select(lambda person: person.first_name).to_list())
+
+generated_persons = (Person("Mathias", "Grønne", index % 80) for index in range(100_000))
+print(PersonQuery(generated_persons).where(lambda person: person.age > 30).count())
+
+if np is not None:
+    person_table = PersonTable(person_list)
+    print(person_table.name_to_age((person_table.ages > 25) & (person_table.ages < 34)))
+    print([person.full_name for person in person_table.persons(person_table.first_name_in(allowed_names) & person_table.has_job(Programmer))])
+
+    # Try benchmark_person_table(nr_of_persons=1_000_000) for a larger run
+    benchmark_person_table(nr_of_persons=10_000)
+
 print("-----------------")
 
 for index, (name, age) in enumerate(name_to_age.items()):
@@ -279,6 +759,19 @@ print(oldest_name_age)
 
 print("-----------------")
 
+acquired_company = Company("Acquired Company")
+new_hire = Person("Mathias", "Grønne", 29)
+acquired_company.hire_many([new_hire, Person("Tobias", "Nielsen", 35), new_hire], Programmer)
+acquired_company.hire_from_stream((Person("Intern", f"Nr. {index}", 20 + index % 5) for index in range(25_000)), Unemployed)
+print(acquired_company)
+print(len(acquired_company.employees_aged(20, 21)))
+
+acquired_company.pay_salery()
+print(f"Programmers: {acquired_company.head_count(Programmer)}, Payroll: {acquired_company.total_salery}")
+print(f"Mean balance: {acquired_company.mean_balance:.2f}, Variance: {acquired_company.balance_variance:.2f}")
+
+print("-----------------")
+
 webshop_a = WebshopCompany("Company A", ["Pant", "Shirt"])
 webshop_b = WebshopCompany("Company B", ["Dog", "Cat"])
 webshop_c = WebshopCompany("Company C", ["Red", "Blue"])
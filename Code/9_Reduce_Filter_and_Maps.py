@@ -0,0 +1,561 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Sequence, Type, TypeVar
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import reduce
+from itertools import compress, islice
+from operator import add, attrgetter
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Person:
+
+    def __init__(self, first_name: str, last_name: str, age: int = 25):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.age = age
+        self._balance: float = 0.0
+        self._job_type: IJob = Unemployed()
+
+
+    @property
+    def job_type(self) -> IJob:
+        return self._job_type
+
+
+    @property
+    def first_name(self) -> str:
+        return self._first_name
+    
+
+    @first_name.setter
+    def first_name(self, first_name: str) -> None:
+        self._first_name: str = first_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def last_name(self) -> str:
+        return self._last_name
+    
+
+    @last_name.setter
+    def last_name(self, last_name: str) -> None:
+        self._last_name: str = last_name
+        self._full_name: str = None
+        self._hash: int = None
+
+
+    @property
+    def full_name(self) -> str:
+        '''
+        Get the person's full name. It is only built again after a name has changed
+        '''
+        if self._full_name is None:
+            self._full_name = f"{self._first_name} {self._last_name}"
+        return self._full_name
+
+
+    @property
+    def balance(self) -> float:
+        '''
+        Get how much money the person got in the bank
+        '''
+        return self._balance
+    
+
+    def spend_money(self, amount: float) -> None:
+        '''
+        The person used this amount of money
+        '''
+        if amount > 0:
+            self._balance -= amount
+
+
+    def give_salery(self, amount: float) -> None:
+        '''
+        The Person recieved the given amount of salery
+        '''
+        if amount > 0:
+            self._balance += amount 
+
+
+    def set_job(self, job: IJob) -> None:
+        self._job_type = job
+
+    
+    @property
+    def is_adult(self) -> bool:
+        '''
+        Check if the person is an adult
+        '''
+        return self.age > 0
+    
+
+    @property
+    def info_as_string(self) -> str:
+        '''
+        Get info as a string
+        '''
+        string: str = f"Person\n"
+        string += f"  Name: {self.full_name}\n"
+        string += f"  Age: {self.age}\n"
+        string += f"  Balance: {self.balance}\n"
+        return string
+    
+
+    def __str__(self) -> str:
+        return self.info_as_string
+    
+
+    def __eq__(self, ref_person: Person) -> bool:
+        return self.full_name == ref_person.full_name and self.age == ref_person.age
+    
+
+    def __gt__(self, ref_person: Person) -> bool:
+        return self.age > ref_person.age
+    
+
+    def __hash__(self) -> hash:
+        if self._hash is None:
+            self._hash = hash(self.full_name)
+        return self._hash
+
+
+
+    
+class Company:
+    _nr_of_companies_created: int = 0
+
+    def __init__(self, name: str):
+        self.name = name
+
+        self._persons_in_company: List[Person] = []
+
+        Company._nr_of_companies_created += 1
+        self._company_id: int = Company._nr_of_companies_created
+
+
+    @property
+    def company_id(self) -> int:
+        return self._company_id
+
+
+
+    def hire(self, person: Person, job_type: Type[IJob]) -> None:
+        '''
+        Hire a person to the company
+        '''
+        person.set_job(job_type())
+        self._persons_in_company += [person]
+
+    
+    def pay_salery(self) -> None:
+        '''
+        Pay salery to personnel
+        '''
+        for person in self._persons_in_company:
+            person.give_salery(person.job_type.salery)
+
+
+    @staticmethod
+    def total_nr_of_created_companies() -> int:
+        return Company._nr_of_companies_created
+    
+
+    def __len__(self) -> int:
+        return len(self._persons_in_company)
+    
+
+    def __str__(self) -> str:
+        string: str = f"Company\n"
+        string += f"  Name: {self.name}\n"
+        string += f"  Workers: {len(self)}"
+        return string
+    
+    
+
+
+
+class WebshopCompany(Company):
+    def __init__(self, name: str, products: List[str]):
+        super().__init__(name)
+        self._products = products
+
+
+    @property
+    def products(self) -> List[str]:
+        return self._products
+    
+
+    def __str__(self) -> str:
+        string = super().__str__()
+        string += f"  Products: {self.products}\n"
+        return string
+
+
+
+class IJob:
+    def __init__(self):
+        pass
+    
+    
+    def do_work(self) -> None:
+        raise NotImplementedError("do_work() not implemented")
+
+
+    @property
+    def salery(self) -> float:
+        raise NotImplementedError("salery() not implemented")    
+
+
+    
+
+class CEO(IJob):
+    def __init__(self):
+        self._salery: float = 75_000
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Creating a strategy or something")
+
+
+
+
+
+class Programmer(IJob):
+    def __init__(self):
+        self._salery: float = 45_000
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Making some code")
+
+
+
+
+class Unemployed(IJob):
+    def __init__(self):
+        self._salery: float = 0
+
+    
+    @property
+    def salery(self) -> float:
+        return self._salery
+    
+
+    def do_work(self) -> None:
+        print("Searching for work")
+
+
+
+
+def split_into_chunks(items: Sequence[Any], chunk_size: int) -> List[Sequence[Any]]:
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+
+def default_chunk_size(nr_of_items: int, nr_of_workers: int) -> int:
+    '''
+    Aim for four chunks per worker, so a slow chunk does not hold the rest back
+    '''
+    return max(1, -(-nr_of_items // (4 * nr_of_workers)))
+
+
+def _map_chunk(function: Callable[[Any], Any], chunk: Sequence[Any]) -> List[Any]:
+    return list(map(function, chunk))
+
+
+def _filter_chunk(predicate: Callable[[Any], bool], chunk: Sequence[Any]) -> List[bool]:
+    return [bool(predicate(item)) for item in chunk]
+
+
+def _reduce_chunk(function: Callable[[Any, Any], Any], key: Callable[[Any], Any], chunk: Sequence[Any]) -> Any:
+    return reduce(function, map(key, chunk) if key is not None else chunk)
+
+
+def tree_reduce(function: Callable[[Any, Any], Any], values: List[Any]) -> Any:
+    '''
+    Combine neighbouring values pairwise, level by level, until one is left.
+    Gives the same result as reduce() when the function is associative
+    '''
+    if not values:
+        raise TypeError("tree_reduce() of empty sequence")
+    while len(values) > 1:
+        values = [function(values[index], values[index + 1]) if index + 1 < len(values) else values[index] for index in range(0, len(values), 2)]
+    return values[0]
+
+
+def _run_chunks(worker: Callable[..., Any], arguments: List[Any], chunks: List[Sequence[Any]], executor: Executor, processes: int) -> List[Any]:
+    '''
+    Run the worker on every chunk in the executor, or in a new process pool
+    '''
+    argument_lists = [[argument] * len(chunks) for argument in arguments]
+    if executor is not None:
+        return list(executor.map(worker, *argument_lists, chunks))
+    with ProcessPoolExecutor(processes) as process_pool:
+        return list(process_pool.map(worker, *argument_lists, chunks))
+
+
+def pmap(function: Callable[[Any], Any], items: Sequence[Any], chunk_size: int = None, processes: int = None, serial_below: int = 10_000, executor: Executor = None) -> List[Any]:
+    '''
+    Like list(map(function, items)), but the items are split into chunks that
+    are mapped in a process pool. Below serial_below items it is just map().
+    The function has to be picklable, so a lambda only works serially
+    '''
+    if len(items) < serial_below:
+        return list(map(function, items))
+    processes = processes or os.cpu_count() or 1
+    chunks = split_into_chunks(items, chunk_size or default_chunk_size(len(items), processes))
+    return [result for chunk_results in _run_chunks(_map_chunk, [function], chunks, executor, processes) for result in chunk_results]
+
+
+def pfilter(predicate: Callable[[Any], bool], items: Sequence[Any], chunk_size: int = None, processes: int = None, serial_below: int = 10_000, executor: Executor = None) -> List[Any]:
+    '''
+    Like list(filter(predicate, items)), with the predicate run in a process pool.
+    The workers only send back which items to keep, so the result holds the
+    original items and not copies of them
+    '''
+    if len(items) < serial_below:
+        return list(filter(predicate, items))
+    processes = processes or os.cpu_count() or 1
+    chunks = split_into_chunks(items, chunk_size or default_chunk_size(len(items), processes))
+    keep: List[bool] = [keep_item for chunk_keep in _run_chunks(_filter_chunk, [predicate], chunks, executor, processes) for keep_item in chunk_keep]
+    return list(compress(items, keep))
+
+
+def preduce(function: Callable[[Any, Any], Any], items: Sequence[Any], key: Callable[[Any], Any] = None, chunk_size: int = None, processes: int = None, serial_below: int = 10_000, executor: Executor = None) -> Any:
+    '''
+    Like reduce(function, map(key, items)). Every chunk is reduced in a process
+    pool and the chunk results are then tree reduced, so the function has to
+    be associative, like add for the total balance
+    '''
+    if len(items) < serial_below:
+        return _reduce_chunk(function, key, items)
+    processes = processes or os.cpu_count() or 1
+    chunks = split_into_chunks(items, chunk_size or default_chunk_size(len(items), processes))
+    return tree_reduce(function, _run_chunks(_reduce_chunk, [function, key], chunks, executor, processes))
+
+
+
+
+@dataclass
+class ReduceResult:
+    value: Any
+    nr_of_items: int
+    stopped: bool
+
+
+def chunked(items: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    '''
+    Read the items a chunk at a time, so a generator is never read to the end at once
+    '''
+    items = iter(items)
+    while chunk := list(islice(items, chunk_size)):
+        yield chunk
+
+
+NUMPY_REDUCERS: Dict[Callable[[Any, Any], Any], Any] = { add: np.add, max: np.maximum, min: np.minimum } if np is not None else {}
+
+
+def _first_stop_index(stop_when: Callable[[Any], Any], running_values: np.ndarray, try_vectorized: bool) -> int:
+    '''
+    Get the index of the first running value stop_when is true for, or -1 when there is none.
+    Get None when stop_when can not be given all the running values at once
+    '''
+    if not try_vectorized:
+        return None
+    try:
+        stops = stop_when(running_values)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(stops, np.ndarray) or stops.dtype != np.bool_ or stops.shape != running_values.shape:
+        return None
+    stop_index: int = int(np.argmax(stops))
+    return stop_index if stops[stop_index] else -1
+
+
+def reduce_in_chunks(function: Callable[[Any, Any], Any], items: Iterable[Any], key: Callable[[Any], Any] = None, initial: Any = None, stop_when: Callable[[Any], bool] = None, chunk_size: int = 10_000, numeric: bool = False) -> Iterator[ReduceResult]:
+    '''
+    Like reduce(function, map(key, items), initial), but the partial result is
+    reported after every chunk. The reduce stops as soon as stop_when is true
+    for the value reduced so far, and the items after that are never read.
+    With numeric=True the values are numbers, and when the function is add,
+    max or min and NumPy is installed, every chunk is reduced by NumPy as
+    64 bit floats. If a chunk turns out not to be numbers, the rest is reduced in Python.
+    stop_when is then first given all the running values of a chunk as an array,
+    like lambda total: total > 1_000_000 works for both. If it does not give back
+    an array of booleans, it is called with one running value at a time
+    '''
+    ufunc = NUMPY_REDUCERS.get(function) if numeric and np is not None else None
+    stop_when_is_vectorized: bool = True
+    value: Any = initial
+    nr_of_items: int = 0
+    for chunk in chunked(items, chunk_size):
+        values: Iterable[Any] = map(key, chunk) if key is not None else chunk
+        if ufunc is not None:
+            try:
+                chunk_values = np.fromiter(values, dtype=np.float64, count=len(chunk))
+            except (TypeError, ValueError):
+                ufunc = None
+                values = map(key, chunk) if key is not None else chunk
+        if ufunc is not None:
+            if stop_when is None:
+                chunk_value = ufunc.reduce(chunk_values)
+                value = float(chunk_value if value is None else ufunc(chunk_value, value))
+                nr_of_items += len(chunk)
+                yield ReduceResult(value, nr_of_items, False)
+                continue
+
+            running_values = ufunc.accumulate(chunk_values)
+            if value is not None:
+                running_values = ufunc(running_values, value)
+            stop_index: int = _first_stop_index(stop_when, running_values, stop_when_is_vectorized)
+            if stop_index is None:
+                stop_when_is_vectorized = False
+                stop_index = next((index for index, running_value in enumerate(running_values.tolist()) if stop_when(running_value)), -1)
+            if stop_index >= 0:
+                yield ReduceResult(float(running_values[stop_index]), nr_of_items + stop_index + 1, True)
+                return
+            value = float(running_values[-1])
+            nr_of_items += len(chunk)
+        else:
+            for item_value in values:
+                value = item_value if value is None else function(value, item_value)
+                nr_of_items += 1
+                if stop_when is not None and stop_when(value):
+                    yield ReduceResult(value, nr_of_items, True)
+                    return
+        yield ReduceResult(value, nr_of_items, False)
+
+
+def reduce_until(function: Callable[[Any, Any], Any], items: Iterable[Any], key: Callable[[Any], Any] = None, initial: Any = None, stop_when: Callable[[Any], bool] = None, chunk_size: int = 10_000, numeric: bool = False) -> ReduceResult:
+    '''
+    Get the final result of reduce_in_chunks()
+    '''
+    result = ReduceResult(initial, 0, False)
+    for result in reduce_in_chunks(function, items, key, initial, stop_when, chunk_size, numeric):
+        pass
+    return result
+
+
+
+
+get_balance = attrgetter("balance")
+
+
+def is_rich(person: Person) -> bool:
+    return person.balance > 50_000
+
+
+def savings_after_40_years(person: Person) -> float:
+    '''
+    A slow function, to show when the process pool pays off for heavier work
+    '''
+    savings: float = person.balance
+    for _ in range(40 * 12):
+        savings = savings * 1.002 + 1_000
+    return savings
+
+
+def benchmark_map_filter_reduce(sizes: List[int], processes: int = None) -> None:
+    '''
+    Time the builtins against the process pool versions, to find the size
+    where the process pool starts to pay off
+    '''
+    with ProcessPoolExecutor(processes) as process_pool:
+        for size in sizes:
+            persons: List[Person] = [Person("Mathias", "Grønne", 29) for _ in range(size)]
+            for index, person in enumerate(persons):
+                person.give_salery(index % 100_000)
+
+            timings = [
+                ("map", lambda: list(map(get_balance, persons))),
+                ("pmap", lambda: pmap(get_balance, persons, serial_below=0, executor=process_pool)),
+                ("map (slow function)", lambda: list(map(savings_after_40_years, persons))),
+                ("pmap (slow function)", lambda: pmap(savings_after_40_years, persons, serial_below=0, executor=process_pool)),
+                ("filter", lambda: list(filter(is_rich, persons))),
+                ("pfilter", lambda: pfilter(is_rich, persons, serial_below=0, executor=process_pool)),
+                ("reduce", lambda: reduce(add, map(get_balance, persons))),
+                ("preduce", lambda: preduce(add, persons, key=get_balance, serial_below=0, executor=process_pool)),
+            ]
+            for name, function in timings:
+                start_time = time.perf_counter()
+                function()
+                print(f"{name:>20}: {time.perf_counter() - start_time:.4f} seconds for {size} persons")
+
+
+def benchmark_reduce_until(nr_of_persons: int) -> None:
+    '''
+    Time reduce_until in Python and with numeric=True, stopping at a threshold that is
+    only reached at the end and with no threshold, on persons and on plain floats
+    '''
+    persons: List[Person] = [Person("Mathias", "Grønne", 29) for _ in range(nr_of_persons)]
+    for index, person in enumerate(persons):
+        person.give_salery(index % 100 + 1)
+    balances: List[float] = [person.balance for person in persons]
+    threshold: float = sum(balances) - 1
+
+    timings = [
+        ("persons, stop_when", lambda numeric: reduce_until(add, persons, key=get_balance, stop_when=lambda total: total > threshold, numeric=numeric)),
+        ("persons", lambda numeric: reduce_until(add, persons, key=get_balance, numeric=numeric)),
+        ("floats, stop_when", lambda numeric: reduce_until(add, balances, stop_when=lambda total: total > threshold, numeric=numeric)),
+        ("floats", lambda numeric: reduce_until(add, balances, numeric=numeric)),
+    ]
+    for name, function in timings:
+        for numeric in [False, True]:
+            start_time = time.perf_counter()
+            result: ReduceResult = function(numeric)
+            print(f"{name:>20}, numeric={numeric!s:>5}: {time.perf_counter() - start_time:.4f} seconds for {nr_of_persons} persons, stopped after {result.nr_of_items}")
+
+
+
+
+if __name__ == "__main__":
+    person_list: List[Person] = [
+        Person("Mathias", "Grønne", 29),
+        Person("Tobias", "Nielsen", 35),
+        Person("Rasmus", "Pedersen", 24),
+        Person("Frank", "Olesen", 32)
+    ]
+    for salery, person in zip([6_700, 18_000, 36_000, 145_000], person_list):
+        person.give_salery(salery)
+
+    print(pmap(lambda person: person.full_name, person_list))
+    print([person.full_name for person in pfilter(is_rich, person_list)])
+    print(preduce(add, person_list, key=get_balance))
+
+    many_persons: List[Person] = person_list * 5_000
+    print(len(pfilter(is_rich, many_persons, serial_below=0)))
+    print(preduce(add, many_persons, key=get_balance, serial_below=0))
+
+    webshop = WebshopCompany("webshop", ["Pant", "Shirt"])
+    for person in person_list:
+        webshop.hire(person, Programmer)
+    print(preduce(add, webshop._persons_in_company, key=get_balance))
+
+    print(reduce_until(max, many_persons, key=get_balance, stop_when=lambda richest: richest > 100_000, numeric=True))
+    print(reduce_until(add, many_persons, key=get_balance, stop_when=lambda total: total > 1_000_000, chunk_size=1_000, numeric=True))
+    print(reduce_until(add, (person for person in person_list), key=lambda person: person.job_type.salery))
+    for partial_result in reduce_in_chunks(add, many_persons, key=get_balance, chunk_size=5_000):
+        print(partial_result)
+
+    benchmark_map_filter_reduce([1_000, 10_000, 100_000])
+    if np is not None:
+        benchmark_reduce_until(1_000_000)